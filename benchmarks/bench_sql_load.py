@@ -0,0 +1,63 @@
+"""
+Compares loading movies the way sql.py used to (one INSERT per row, autocommit)
+with the batched loader in sql.py.
+
+Usage: python -m benchmarks.bench_sql_load [rows]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import sql
+
+
+def fake_movies(count):
+    for id in range(1, count + 1):
+        yield (
+            id,
+            f"Movie {id}",
+            random.randint(1, 300) * 1_000_000,
+            random.random() * 150,
+            random.randint(1, count // 10 + 1),
+            random.random() * 3e9,
+        )
+
+
+def legacy_load(path, rows):
+    conn = sqlite3.connect(path, isolation_level=None)
+    c = conn.cursor()
+    c.executescript(sql.SCHEMA.replace("budget INTEGER", "budget TEXT"))
+    for row in rows:
+        c.execute("INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?)", row)
+    c.close()
+    conn.close()
+
+
+def bulk_load(path, rows):
+    conn = sql.connect(path)
+    sql.create_schema(conn)
+    sql.load(conn, "movies", rows)
+    sql.create_indexes(conn)
+    conn.close()
+
+
+def timed(name, fn, rows):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        fn(os.path.join(directory, "movies.sqlite"), rows)
+        elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(rows):>9} rows {elapsed:8.2f}s {len(rows) / elapsed:12.0f} rows/s")
+
+
+def main(count):
+    rows = list(fake_movies(count))
+    # Autocommit makes every row its own transaction, so the legacy path gets a smaller sample.
+    timed("legacy (row by row)", legacy_load, rows[: min(count, 20_000)])
+    timed("sql.load (batched, WAL)", bulk_load, rows)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -1,23 +1,41 @@
+import hashlib
 import json
+import math
 import streamlit as st
 
-from langchain.document_loaders import UnstructuredFileLoader
-from langchain.retrievers import WikipediaRetriever
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.callbacks import StreamingStdOutCallbackHandler
 
-from langchain.schema import BaseOutputParser, output_parser
-
-
-class JsonOutputParser(BaseOutputParser):
-    def parse(self, text):
-        text = text.replace("```", "").replace("json", "")
-        return json.loads(text)
-
+from utils.chunking import iter_split_documents
+from utils.concurrency import iter_concurrently, map_concurrently
+from utils.doc_store import DocumentStore
+from utils.llm_gateway import get_chat_model
+from utils.parse_worker import ParseError, iter_parse_file
+from utils.quiz_store import QuizStore, quiz_key
+from utils.wikipedia import get_wikipedia_client
+from utils.quiz import (
+    QuestionSelector,
+    QuestionStreamParser,
+    group_docs,
+    parse_quiz_text,
+    select_questions,
+)
 
-output_parser = JsonOutputParser()
+QUESTION_COUNT = 10
+# Bump when the quiz prompts change, so quizzes made with the old ones are not served.
+QUIZ_PROMPT_VERSION = 2
+# Chunks are packed into groups of this many tokens, and one group is one question-generating call.
+QUIZ_GROUP_TOKENS = 3000
+QUIZ_MAX_GROUPS = 8
+QUIZ_MAX_CONCURRENCY = 4
+QUIZ_GROUP_TIMEOUT = 120
+
+QUIZ_SPLITTER = {
+    "kind": "character",
+    "separator": "\n",
+    "chunk_size": 600,
+    "chunk_overlap": 100,
+}
 
 st.set_page_config(
     page_title="QuitGPT",
@@ -35,8 +53,10 @@ def format_docs(docs):
     return "\n\n".join(document.page_content for document in docs)
 
 
-llm = ChatOpenAI(
-    temperature=0.1,
+# No response cache: QuizStore keeps several variants per document and needs a fresh quiz for each.
+llm = get_chat_model(
+    cache=False,
+    max_tokens=None,
     model="gpt-3.5-turbo-0125",
     streaming=True,
     callbacks=[StreamingStdOutCallbackHandler()],
@@ -49,7 +69,7 @@ questions_prompt = ChatPromptTemplate.from_messages(
             """
                 You are a helpful assistant that is role playing as a teacher.
                     
-                Based ONLY on the following context make 10 (TEN) questions to test the user's knowledge about the text.
+                Based ONLY on the following context make {count} questions to test the user's knowledge about the text.
                 
                 Each question should have 4 answers, three of them must be incorrect and one should be correct.
                     
@@ -78,160 +98,190 @@ questions_prompt = ChatPromptTemplate.from_messages(
 )
 
 
-questions_chain = {"context": format_docs} | questions_prompt | llm
+questions_chain = (
+    {
+        "context": lambda inputs: format_docs(inputs["docs"]),
+        "count": lambda inputs: inputs["count"],
+    }
+    | questions_prompt
+    | llm
+)
 
-formatting_prompt = ChatPromptTemplate.from_messages(
+fix_prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
             """
-                You are a powerful formatting algorithm.
-                
-                You format exam questions into JSON format.
-                Answers with (o) are the correct ones.
-                
-                Example Input:
+                The following exam questions are malformed.
+                Rewrite each of them so it has exactly 4 answers separated by |, with (o) after the only correct one.
+
+                Example:
+
                 Question: What is the color of the ocean?
                 Answers: Red|Yellow|Green|Blue(o)
-                    
-                Question: What is the capital or Georgia?
-                Answers: Baku|Tbilisi(o)|Manila|Beirut
-                    
-                Question: When was Avatar released?
-                Answers: 2007|2001|2009(o)|1998
-                    
-                Question: Who was Julius Caesar?
-                Answers: A Roman Emperor(o)|Painter|Actor|Model
-                
-                
-                Example Output:
-                
-                ```json
-                {{ "questions": [
-                        {{
-                            "question": "What is the color of the ocean?",
-                            "answers": [
-                                    {{
-                                        "answer": "Red",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Yellow",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Green",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Blue",
-                                        "correct": true
-                                    }},
-                            ]
-                        }},
-                                    {{
-                            "question": "What is the capital or Georgia?",
-                            "answers": [
-                                    {{
-                                        "answer": "Baku",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Tbilisi",
-                                        "correct": true
-                                    }},
-                                    {{
-                                        "answer": "Manila",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Beirut",
-                                        "correct": false
-                                    }},
-                            ]
-                        }},
-                                    {{
-                            "question": "When was Avatar released?",
-                            "answers": [
-                                    {{
-                                        "answer": "2007",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "2001",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "2009",
-                                        "correct": true
-                                    }},
-                                    {{
-                                        "answer": "1998",
-                                        "correct": false
-                                    }},
-                            ]
-                        }},
-                        {{
-                            "question": "Who was Julius Caesar?",
-                            "answers": [
-                                    {{
-                                        "answer": "A Roman Emperor",
-                                        "correct": true
-                                    }},
-                                    {{
-                                        "answer": "Painter",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Actor",
-                                        "correct": false
-                                    }},
-                                    {{
-                                        "answer": "Model",
-                                        "correct": false
-                                    }},
-                            ]
-                        }}
-                    ]
-                }}
-                ```
-                Your turn!
-                Questions: {context}
+
+                Questions: {questions}
             """,
         )
     ]
 )
 
-formatting_chain = formatting_prompt | llm
+fix_chain = fix_prompt | llm
 
 
-@st.cache_data(show_spinner="Loading File...")
-def split_file(file):
-    file_content = file.read()
-    file_path = f"./.cache/quiz_files/{file.name}"
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        separator="\n",
-        chunk_size=600,
-        chunk_overlap=100,
-    )
-    loader = UnstructuredFileLoader(file_path)
-    docs = loader.load_and_split(text_splitter=splitter)
-    return docs
+def fix_questions(malformed):
+    # Retry only the malformed questions, once.
+    if not malformed:
+        return []
+    fixed = fix_chain.invoke({"questions": "\n\n".join(malformed)})
+    return parse_quiz_text(fixed.content)[0]
+
+
+def parse_quiz(message):
+    questions, malformed = parse_quiz_text(message.content)
+    return {"questions": questions + fix_questions(malformed)}
 
 
-@st.cache_data(show_spinner="Making quiz...")
-def run_quiz_chain(_docs, topic):
-    chain = {"context": questions_chain} | formatting_chain | output_parser
-    return chain.invoke(_docs)
+@st.cache_resource
+def get_doc_store():
+    return DocumentStore()
+
+
+# Not st.cache_data: the document store already keeps the chunks, and the progress updates
+# below are where Streamlit stops the script (and the parser) when the user navigates away.
+def split_file(file):
+    store = get_doc_store()
+    key = store.put_raw(file.getvalue(), file.name)
+    splitter_hash = hashlib.sha256(
+        json.dumps(QUIZ_SPLITTER, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    chunks_name = f"chunks-{splitter_hash}"
+    if (chunks := store.load_docs(key, chunks_name)) is not None:
+        return chunks
+
+    if (text_docs := store.load_docs(key, "text")) is not None:
+        chunks = list(iter_split_documents(text_docs, QUIZ_SPLITTER))
+    else:
+        # Pages are split as soon as the parser sends them.
+        text_docs = []
+        chunks = []
+        progress = st.empty()
+        for doc in iter_parse_file(store.raw_path(key)):
+            text_docs.append(doc)
+            chunks += iter_split_documents([doc], QUIZ_SPLITTER)
+            progress.caption(f"Parsed {len(text_docs)} page(s) of {file.name}...")
+        progress.empty()
+        store.save_docs(key, "text", text_docs)
+    store.save_docs(key, chunks_name, chunks)
+    return chunks
+
+
+@st.cache_resource
+def get_quiz_store():
+    return QuizStore(min_questions=QUESTION_COUNT)
+
+
+def run_quiz_chain(docs):
+    chain = questions_chain | parse_quiz
+    groups = group_docs(docs, QUIZ_GROUP_TOKENS, QUIZ_MAX_GROUPS)
+    if len(groups) == 1:
+        return chain.invoke({"docs": groups[0], "count": QUESTION_COUNT})
+
+    # Ask every group for a few more than its share, to have room for dropping duplicates.
+    per_group = min(QUESTION_COUNT, math.ceil(QUESTION_COUNT * 1.5 / len(groups)))
+    outcomes = map_concurrently(
+        lambda group: chain.invoke({"docs": group, "count": per_group}),
+        groups,
+        max_workers=QUIZ_MAX_CONCURRENCY,
+        timeout=QUIZ_GROUP_TIMEOUT,
+    )
+    candidates = []
+    for result, error in outcomes:
+        if error is not None:
+            print(f"Skipping a chunk group: {error!r}")
+            continue
+        candidates.append(result["questions"])
+    return {"questions": select_questions(candidates, QUESTION_COUNT)}
+
+
+def get_quiz_key(docs):
+    return quiz_key(docs, llm.model_name, QUIZ_PROMPT_VERSION)
+
+
+def generate_quiz(docs):
+    """
+    Yields the quiz questions one by one, as soon as each one has been generated.
+    Documents too large for one call are split into groups like run_quiz_chain does,
+    and each group's questions are yielded as soon as its call finishes.
+    """
+    groups = group_docs(docs, QUIZ_GROUP_TOKENS, QUIZ_MAX_GROUPS)
+    if len(groups) > 1:
+        chain = questions_chain | parse_quiz
+        per_group = min(QUESTION_COUNT, math.ceil(QUESTION_COUNT * 1.5 / len(groups)))
+        selector = QuestionSelector(
+            QUESTION_COUNT, quota=math.ceil(QUESTION_COUNT / len(groups))
+        )
+        progress = st.empty()
+        progress.caption(f"Making quiz from {len(groups)} parts of the document...")
+        for done, (_, result, error) in enumerate(
+            iter_concurrently(
+                lambda group: chain.invoke({"docs": group, "count": per_group}),
+                groups,
+                max_workers=QUIZ_MAX_CONCURRENCY,
+                timeout=QUIZ_GROUP_TIMEOUT,
+            ),
+            start=1,
+        ):
+            progress.caption(f"Made questions for {done} of {len(groups)} parts...")
+            if error is not None:
+                print(f"Skipping a chunk group: {error!r}")
+                continue
+            yield from selector.add(result["questions"])
+        progress.empty()
+        yield from selector.finish()
+        return
+    parser = QuestionStreamParser()
+    for chunk in questions_chain.stream({"docs": groups[0], "count": QUESTION_COUNT}):
+        yield from parser.feed(chunk.content)
+    yield from parser.close()
+    yield from fix_questions(parser.malformed)
+
+
+def stream_quiz(docs):
+    """
+    Serves a stored quiz for these docs when there is one, and makes another variant in the background.
+    Otherwise streams a new quiz and stores it once it is complete.
+    """
+    store = get_quiz_store()
+    key = get_quiz_key(docs)
+    if (questions := store.get(key)) is not None:
+        store.pregenerate(key, lambda: run_quiz_chain(docs)["questions"])
+        yield from questions
+        return
+    questions = []
+    for question in generate_quiz(docs):
+        questions.append(question)
+        yield question
+    if not store.put(key, questions):
+        print(f"Not storing an incomplete quiz ({len(questions)} questions)")
 
 
 @st.cache_data(show_spinner="Searching Wikipedia...")
 def wiki_search(term):
-    retriever = WikipediaRetriever(top_k_results=5)
-    docs = retriever.get_relevant_documents(term)
-    return docs
+    return get_wikipedia_client().get_documents(term, top_k=5, prefetch=True)
+
+
+def render_question(question):
+    st.write(question["question"])
+    value = st.radio(
+        "Select an option.",
+        [answer["answer"] for answer in question["answers"]],
+        index=None,
+    )
+    if {"answer": value, "correct": True} in question["answers"]:
+        st.success("Correct!")
+    elif value is not None:
+        st.error("Wrong!")
 
 
 def save_api_key(api_key):
@@ -272,7 +322,10 @@ with st.sidebar:
                 "Upload a .docx, .txt or .pdf file",
                 type=["pdf", "txt", "docx"],
             ):
-                docs = split_file(file)
+                try:
+                    docs = split_file(file)
+                except ParseError as e:
+                    st.error(e)
 
         else:
             if topic := st.text_input("Name of the article"):
@@ -293,19 +346,18 @@ else:
 
     start = st.button("Generate Quiz")
 
+    key = get_quiz_key(docs)
     if start:
-        response = run_quiz_chain(docs, topic if topic else file.name)
+        questions = []
+        with st.form("questions_form"):
+            for question in stream_quiz(docs):
+                render_question(question)
+                questions.append(question)
+            button = st.form_submit_button()
+        st.session_state["quiz"] = {"key": key, "questions": questions}
+    elif (quiz := st.session_state.get("quiz")) and quiz["key"] == key:
+        # Submitting the form reruns the page, so the quiz is drawn again from session_state.
         with st.form("questions_form"):
-            st.write(response)
-            for question in response["questions"]:
-                st.write(question["question"])
-                value = st.radio(
-                    "Select an option.",
-                    [answer["answer"] for answer in question["answers"]],
-                    index=None,
-                )
-                if {"answer": value, "correct": True} in question["answers"]:
-                    st.success("Correct!")
-                elif value is not None:
-                    st.error("Wrong!")
+            for question in quiz["questions"]:
+                render_question(question)
             button = st.form_submit_button()
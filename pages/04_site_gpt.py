@@ -1,17 +1,34 @@
+import re
+import time
 import streamlit as st
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema.runnable import RunnableLambda, RunnablePassthrough
 
-from langchain.vectorstores.faiss import FAISS
-from langchain.document_loaders import SitemapLoader
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 
+from utils.answer_cache import AnswerCache
+from utils.bm25 import HybridRetriever
+from utils.concurrency import map_concurrently
+from utils.embedding_cache import CachedEmbeddings
+from utils.html_extract import extractor_for
+from utils.llm_gateway import get_chat_model, get_embeddings_model
+from utils.rerank import rerank
+from utils.site_index import load_site_index
+from utils.tokens import count_tokens
 
-llm = ChatOpenAI(
-    temperature=0.1,
-)
+# How many answer calls run at once, and how long a single one may take.
+ANSWERS_MAX_CONCURRENCY = 8
+ANSWER_TIMEOUT = 30
+# Token budget for the answers passed to choose_answer.
+ANSWERS_TOKEN_BUDGET = 2000
+
+SITE_SPLITTER = {
+    "kind": "recursive",
+    "chunk_size": 1000,
+    "chunk_overlap": 200,
+}
+
+
+# No max_tokens cap from model.json: the final answer with its citations must not be cut off.
+llm = get_chat_model(max_tokens=None)
 
 answers_prompt = ChatPromptTemplate.from_template(
     """
@@ -40,23 +57,46 @@ if "key" not in st.session_state:
     st.session_state["key"] = None
 
 
-def get_answers(inputs):
-    docs = inputs["docs"]
+def get_answers(inputs, on_progress=None):
     question = inputs["question"]
+    docs = rerank(question, inputs["docs"], get_embeddings())
 
     answers_chain = answers_prompt | llm
-    return {
-        "question": question,
-        "answers": [
+
+    def answer(doc):
+        return answers_chain.invoke(
+            {"question": question, "context": doc.page_content}
+        ).content
+
+    finished = []
+
+    def on_result(index, result, error):
+        finished.append(index)
+        if on_progress:
+            on_progress(len(finished), len(docs))
+
+    outcomes = map_concurrently(
+        answer,
+        docs,
+        max_workers=ANSWERS_MAX_CONCURRENCY,
+        timeout=ANSWER_TIMEOUT,
+        on_result=on_result,
+    )
+    answers = []
+    for doc, (content, error) in zip(docs, outcomes):
+        if error is not None:
+            print(f"Skipping {doc.metadata['source']}: {error!r}")
+            continue
+        answers.append(
             {
-                "answer": answers_chain.invoke(
-                    {"question": question, "context": doc.page_content}
-                ).content,
+                "answer": content,
                 "source": doc.metadata["source"],
-                "date": doc.metadata["lastmod"],
+                "date": doc.metadata.get("lastmod"),
             }
-            for doc in docs
-        ],
+        )
+    return {
+        "question": question,
+        "answers": answers,
     }
 
 
@@ -76,16 +116,43 @@ choose_prompt = ChatPromptTemplate.from_messages(
 )
 
 
+def get_score(answer):
+    match = re.search(r"Score:\s*(\d+(?:\.\d+)?)", answer)
+    return float(match.group(1)) if match else None
+
+
+def condense_answers(answers, budget=ANSWERS_TOKEN_BUDGET):
+    """
+    Drops the zero-score answers and joins the rest, best score and most recent first,
+    until the token budget is used up.
+    """
+    scored = []
+    for answer in answers:
+        score = get_score(answer["answer"])
+        if score == 0:
+            continue
+        scored.append((score or 0, answer["date"] or "", answer))
+    scored.sort(key=lambda item: item[:2], reverse=True)
+
+    parts = []
+    used = 0
+    for _, _, answer in scored:
+        part = f"{answer['answer']}\nSource:{answer['source']}\nDate:{answer['date']}\n"
+        tokens = count_tokens(part)
+        if used + tokens > budget:
+            continue
+        parts.append(part)
+        used += tokens
+    return "\n\n".join(parts)
+
+
 def choose_answer(inputs):
     answers = inputs["answers"]
     question = inputs["question"]
     choose_chain = choose_prompt | llm
 
-    condensed = "\n\n".join(
-        f"{answer['answer']}\nSource:{answer['source']}\nDate:{answer['date']}\n"
-        for answer in answers
-    )
-    return choose_chain.invoke(
+    condensed = condense_answers(answers)
+    return choose_chain.stream(
         {
             "question": question,
             "answers": condensed,
@@ -98,36 +165,34 @@ def save_api_key(api_key):
     st.session_state["api_key_bool"] = True
 
 
-def parse_page(soup):
-    header = soup.find("header")
-    footer = soup.find("footer")
-    if header:
-        header.decompose()
-    if footer:
-        footer.decompose()
-    return (
-        str(soup.get_text())
-        .replace("\n", " ")
-        .replace("\xa0", " ")
-        .replace("CloseSearch Submit Blog", "")
-    )
+@st.cache_resource
+def get_embeddings():
+    return CachedEmbeddings(get_embeddings_model())
 
 
-@st.cache_data(show_spinner="Loading website...")
+# cache_resource, not cache_data: the retriever holds the embedding cache's SQLite connection.
+@st.cache_resource(show_spinner="Loading website...")
 def load_website(url):
-    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=1000,
-        chunk_overlap=200,
-    )
-    loader = SitemapLoader(
+    embeddings = get_embeddings()
+    vector_store, bm25, version = load_site_index(
         url,
         filter_urls=[r"^(.*\/(ai-gateway|vectorize|workers-ai)\/).*"],
-        parsing_function=parse_page,
+        extractor=extractor_for(url),
+        splitter_config=SITE_SPLITTER,
+        embeddings=embeddings,
     )
-    loader.requests_per_second = 5
-    docs = loader.load_and_split(text_splitter=splitter)
-    vector_store = FAISS.from_documents(docs, OpenAIEmbeddings())
-    return vector_store.as_retriever()
+    print(f"Embedding cache hit rate: {embeddings.hit_rate:.0%}")
+    retriever = HybridRetriever(
+        vector_store=vector_store,
+        bm25=bm25,
+        embeddings=embeddings,
+    )
+    return retriever, version
+
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(threshold=0.95, ttl=60 * 60, max_entries=500)
 
 
 st.set_page_config(
@@ -172,17 +237,44 @@ if url:
         with st.sidebar:
             st.error("Please write down a Sitemap URL.")
     else:
-        retriever = load_website(url)
+        retriever, version = load_website(url)
         query = st.text_input("Ask a question to the website.")
         if query:
-            chain = (
-                {
-                    "docs": retriever,
-                    "question": RunnablePassthrough(),
-                }
-                | RunnableLambda(get_answers)
-                | RunnableLambda(choose_answer)
-            )
-
-            result = chain.invoke(query)
-            st.markdown(result.content.replace("$", "\$"))
+            answer_cache = get_answer_cache()
+            query_vector = get_embeddings().embed_query(query)
+            cached = answer_cache.get(url, version, query_vector)
+            if cached:
+                answer, sources = cached["answer"], cached["sources"]
+                st.markdown(answer.replace("$", "\$"))
+            else:
+                start = time.perf_counter()
+                progress = st.progress(0.0, text="Reading the documents...")
+                docs = retriever.get_relevant_documents(query)
+                answers = get_answers(
+                    {"docs": docs, "question": query},
+                    on_progress=lambda done, total: progress.progress(
+                        done / total, text=f"Read {done} of {total} documents..."
+                    ),
+                )
+                progress.empty()
+
+                placeholder = st.empty()
+                answer = ""
+                escaped = ""
+                for chunk in choose_answer(answers):
+                    if not answer and chunk.content:
+                        ttft = time.perf_counter() - start
+                        st.session_state.setdefault("ttft", []).append(ttft)
+                        print(f"Time to first token: {ttft:.2f}s")
+                    answer += chunk.content
+                    escaped += chunk.content.replace("$", "\$")
+                    placeholder.markdown(escaped)
+                sources = list(dict.fromkeys(a["source"] for a in answers["answers"]))
+                # Nothing to cache when every answer call failed or scored 0 (e.g. during an outage):
+                # the "I don't know" would be served to every similar question for an hour.
+                if any(get_score(a["answer"]) != 0 for a in answers["answers"]):
+                    answer_cache.put(url, version, query_vector, answer, sources)
+
+            with st.expander("Sources"):
+                for source in sources:
+                    st.write(source)
@@ -1,10 +1,11 @@
-import json
 import streamlit as st
 import openai as client
-from langchain.utilities import DuckDuckGoSearchAPIWrapper
-from langchain_community.utilities import WikipediaAPIWrapper
 from langchain.schema import SystemMessage
 
+from utils.llm_gateway import get_http_client
+from utils.research_sessions import ResearchSessions, normalize_theme
+from utils.research_tools import runtime
+
 
 st.set_page_config(
     page_title="ResearchGPT",
@@ -64,66 +65,17 @@ st.markdown(
 #     def _run(self, query):
 #         ddg = DuckDuckGoSearchAPIWrapper()
 #         return ddg.run(query)
-def get_wpd_result(inputs):
-    wpd = WikipediaAPIWrapper()
-    theme = inputs["theme"]
-    return wpd.run(theme)
-
-
-def get_ddg_result(inputs):
-    ddg = DuckDuckGoSearchAPIWrapper()
-    theme = inputs["theme"]
-    return ddg.run(theme)
-
-
-functions = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_wpd_result",
-            "description": "Returns content searched in Wikipedia with the given theme.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "theme": {
-                        "type": "string",
-                        "description": "The theme that user wants to search",
-                    }
-                },
-                "required": [
-                    "theme",
-                ],
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_ddg_result",
-            "description": "Returns content searched in DuckDuckGo with the given theme.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "theme": {
-                        "type": "string",
-                        "description": "The theme that user wants to search",
-                    }
-                },
-                "required": [
-                    "theme",
-                ],
-            },
-        },
-    },
-]
-
-functions_map = {
-    "get_wpd_result": get_wpd_result,
-    "get_ddg_result": get_ddg_result,
-}
+functions = runtime.functions
+
+functions_map = runtime.functions_map
 
 assistant_id = "asst_xOBOeZm04lCOfUlMHaJ10BwZ"
 
+# Assistants calls share the gateway's rate limit and retries.
+# They are never served from the response cache, since runs and threads are stateful.
+client.http_client = get_http_client()
+client.max_retries = 0
+
 
 # agent = initialize_agent(
 #     llm=llm,
@@ -146,50 +98,9 @@ assistant_id = "asst_xOBOeZm04lCOfUlMHaJ10BwZ"
 # )
 
 
-def get_run(run_id, thread_id):
-    return client.beta.threads.runs.retrieve(run_id=run_id, thread_id=thread_id)
-
-
-def send_message(thread_id, content):
-    return client.beta.threads.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=content,
-    )
-
-
-def get_messages(thread_id):
-    messages = client.beta.threads.messages.list(thread_id=thread_id).data
-    messages.reverse()
-    for message in messages:
-        print(f"{message.role}: ", end=" ")
-        if message.content:
-            print(message.content[0].text.value)
-
-
-def get_tool_outputs(run_id, thread_id):
-    run = get_run(run_id, thread_id)
-    outputs = []
-    for action in run.required_action.submit_tool_outputs.tool_calls:
-        action_id = action.id
-        function = action.function
-        print(f"Calling function: {function.name} with arg {function.arguments}")
-        outputs.append(
-            {
-                "output": functions_map[function.name](json.loads(function.arguments)),
-                "tool_call_id": action_id,
-            }
-        )
-    return outputs
-
-
-def submit_tool_outputs(run_id, thread_id):
-    outputs = get_tool_outputs(run_id, thread_id)
-    return client.beta.threads.runs.submit_tool_outputs(
-        run_id=run_id,
-        thread_id=thread_id,
-        tool_outputs=outputs,
-    )
+@st.cache_resource
+def get_research_sessions():
+    return ResearchSessions(client, assistant_id, functions_map)
 
 
 def save_api_key(api_key):
@@ -218,27 +129,35 @@ with st.sidebar:
     theme = st.text_input("Write the name of the theme you are interested on.")
 
 if theme:
-    thread = client.beta.threads.create(
-        messages=[
-            {
-                "role": "user",
-                "content": "I want to search the theme i provided in DuckDuckGo and Wikipedia",
-            }
-        ]
-    )
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id=assistant_id,
-    )
-    get_messages(thread.id)
-    submit_tool_outputs(run.id, thread.id)
-    get_tool_outputs(run.id, thread.id)
-    # while get_run(run.id, thread.id).status != "completed":
-    #     send_message(thread.id, "Go ahead!")
-    # get_messages(thread.id)
-    # get_tool_outputs(run.id, thread.id)
-    # with open("research.txt", "wb") as file:
-    #     encoded = result["output"].encode("utf-8")
-    #     file.write(encoded)
-
-    # st.write(result)
+    # Reruns (e.g. from the sidebar) reuse the result instead of starting the research again.
+    results = st.session_state.setdefault("research", {})
+    result = results.get(normalize_theme(theme))
+    if result is None:
+        with st.status("Researching...") as status:
+            try:
+                result = get_research_sessions().research(
+                    theme,
+                    on_status=lambda run: status.update(label=f"Run status: {run.status}"),
+                )
+            except Exception as e:
+                # e.g. the thread or run could not be created.
+                result = {"status": "failed", "report": None, "error": str(e)}
+            status.update(
+                label=f"Run status: {result['status']}",
+                state="complete" if result["status"] == "completed" else "error",
+            )
+        if result["status"] == "completed":
+            results[normalize_theme(theme)] = result
+
+    if result["status"] == "completed":
+        st.markdown(result["report"])
+        st.download_button(
+            "Download the report",
+            result["report"],
+            file_name="research.txt",
+        )
+    else:
+        message = f"The research run ended as {result['status']}."
+        if result.get("error"):
+            message += f" {result['error']}"
+        st.error(message)
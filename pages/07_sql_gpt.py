@@ -0,0 +1,105 @@
+import re
+import streamlit as st
+
+from langchain.prompts import ChatPromptTemplate
+
+from utils.llm_gateway import get_chat_model
+from utils.sql_query import QueryEngine, QueryTimeout, UnsafeQuery
+
+
+llm = get_chat_model(temperature=0, max_tokens=None)
+
+sql_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """
+            You are a SQLite expert. Given the database below, write ONE SQLite SELECT query that answers the user's question.
+            Only select the columns needed to answer the question and never return more than {max_rows} rows.
+            Reply with the SQL only, no explanation and no code fences.
+
+            Database:
+            {schema}
+            """,
+        ),
+        ("human", "{question}"),
+    ]
+)
+
+sql_chain = sql_prompt | llm
+
+
+@st.cache_resource
+def get_query_engine():
+    return QueryEngine("movies.sqlite", time_limit=5, max_rows=200)
+
+
+def extract_sql(text):
+    text = re.sub(r"^```(?:sql)?|```$", "", text.strip(), flags=re.IGNORECASE)
+    return text.strip()
+
+
+def save_api_key(api_key):
+    st.session_state["key"] = api_key
+    st.session_state["api_key_bool"] = True
+
+
+st.set_page_config(
+    page_title="SQLGPT",
+    page_icon="🗃️",
+)
+
+st.markdown(
+    """
+    # SQLGPT
+
+    Ask questions about the movies database in plain English.
+"""
+)
+
+with st.sidebar:
+    api_key = st.text_input(
+        "자신의 OPENAI_API_KEY를 입력해 주세요.",
+        disabled=st.session_state.get("key") is not None,
+    ).strip()
+
+    if api_key:
+        save_api_key(api_key)
+        st.write("API_KEY가 저장되었습니다.")
+
+    if button := st.button("저장", disabled=st.session_state.get("key") is not None):
+        save_api_key(api_key)
+        if api_key == "":
+            st.write("API_KEY를 넣어주세요.")
+
+engine = get_query_engine()
+
+with st.expander("Schema"):
+    st.code(engine.schema_snapshot(), language="sql")
+
+question = st.text_input(
+    "Ask a question about the movies.",
+    disabled=st.session_state.get("key") is None,
+)
+
+if question:
+    with st.spinner("Writing the query..."):
+        response = sql_chain.invoke(
+            {
+                "schema": engine.schema_snapshot(),
+                "question": question,
+                "max_rows": engine.max_rows,
+            }
+        )
+    sql = extract_sql(response.content)
+    st.code(sql, language="sql")
+    try:
+        columns, rows = engine.query(sql)
+    except (UnsafeQuery, QueryTimeout) as e:
+        st.error(str(e))
+    except Exception as e:
+        st.error(f"The query failed: {e}")
+    else:
+        st.dataframe([dict(zip(columns, row)) for row in rows], use_container_width=True)
+        if len(rows) == engine.max_rows:
+            st.caption(f"Showing the first {engine.max_rows} rows.")
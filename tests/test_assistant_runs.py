@@ -0,0 +1,108 @@
+"""
+Checks run_until_done against a local fake of the threads/runs API.
+
+Usage: python -m pytest tests
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from utils.assistant_runs import run_until_done
+
+
+def tool_call(id, name, arguments):
+    return SimpleNamespace(
+        id=id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments))
+    )
+
+
+class FakeRuns:
+    """
+    Hands out the statuses in script, one per retrieve(), and stays on the last one.
+    Moves to the status after a requires_action only once its tool outputs are submitted.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.submitted = []
+        self.cancelled = []
+
+    def retrieve(self, run_id, thread_id):
+        status, tool_calls = self.script[0]
+        if len(self.script) > 1 and status != "requires_action":
+            self.script.pop(0)
+        run = SimpleNamespace(id=run_id, status=status, required_action=None)
+        if tool_calls:
+            run.required_action = SimpleNamespace(
+                submit_tool_outputs=SimpleNamespace(tool_calls=tool_calls)
+            )
+        return run
+
+    def submit_tool_outputs(self, run_id, thread_id, tool_outputs):
+        assert self.script[0][0] == "requires_action"
+        self.submitted.append(tool_outputs)
+        self.script.pop(0)
+
+    def cancel(self, run_id, thread_id):
+        self.cancelled.append(run_id)
+
+
+def fake_client(runs):
+    return SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+
+
+def test_submits_tool_outputs_and_completes():
+    runs = FakeRuns(
+        [
+            ("queued", None),
+            (
+                "requires_action",
+                [
+                    tool_call("call_1", "echo", {"query": "a"}),
+                    tool_call("call_2", "fail", {"query": "b"}),
+                ],
+            ),
+            ("in_progress", None),
+            ("completed", None),
+        ]
+    )
+
+    def fail(inputs):
+        raise ValueError("boom")
+
+    functions_map = {"echo": lambda inputs: inputs["query"].upper(), "fail": fail}
+    statuses = []
+    run = run_until_done(
+        fake_client(runs),
+        "thread_1",
+        "run_1",
+        functions_map,
+        poll_interval=0.01,
+        on_status=lambda run: statuses.append(run.status),
+    )
+
+    assert run.status == "completed"
+    assert statuses == ["queued", "requires_action", "in_progress", "completed"]
+    assert len(runs.submitted) == 1
+    outputs = {output["tool_call_id"]: output["output"] for output in runs.submitted[0]}
+    assert outputs["call_1"] == "A"
+    # A failing tool reports its error instead of sinking the run.
+    assert outputs["call_2"].startswith("Error: ValueError")
+    assert runs.cancelled == []
+
+
+def test_cancels_and_raises_after_deadline():
+    runs = FakeRuns([("in_progress", None)])
+
+    with pytest.raises(TimeoutError):
+        run_until_done(
+            fake_client(runs),
+            "thread_1",
+            "run_1",
+            {},
+            deadline=0.05,
+            poll_interval=0.01,
+            max_poll_interval=0.02,
+        )
+    assert runs.cancelled == ["run_1"]
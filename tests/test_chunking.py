@@ -0,0 +1,49 @@
+"""
+Checks iter_split_documents with a stub splitter (the real ones need tiktoken's encodings).
+
+Usage: python -m pytest tests
+"""
+import json
+import sqlite3
+
+from langchain.schema import Document
+
+from utils import chunking
+
+
+class StubSplitter:
+    def split_text(self, text):
+        return [f"{text} (1)", f"{text} (2)"]
+
+
+def test_duplicate_documents_get_their_own_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(chunking, "get_splitter", lambda config: StubSplitter())
+    path = str(tmp_path / "chunks.sqlite")
+    config = {"kind": "recursive", "chunk_size": 100, "chunk_overlap": 0}
+    docs = [
+        Document(page_content=text, metadata={"page": i})
+        for i, text in enumerate(["same text", "same text", "c", "d"])
+    ]
+
+    for _ in range(2):  # Cold, then entirely from the chunk cache.
+        chunks = list(chunking.iter_split_documents(docs, config, path=path))
+        assert [(chunk.metadata["page"], chunk.page_content) for chunk in chunks] == [
+            (0, "same text (1)"),
+            (0, "same text (2)"),
+            (1, "same text (1)"),
+            (1, "same text (2)"),
+            (2, "c (1)"),
+            (2, "c (2)"),
+            (3, "d (1)"),
+            (3, "d (2)"),
+        ]
+
+    conn = sqlite3.connect(path)
+    stored = {
+        key: json.loads(texts)
+        for key, texts in conn.execute("SELECT key, chunks FROM chunks")
+    }
+    assert stored == {
+        chunking._cache_key(text, config): [f"{text} (1)", f"{text} (2)"]
+        for text in ["same text", "c", "d"]
+    }
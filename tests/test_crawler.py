@@ -0,0 +1,164 @@
+"""
+Checks Crawler against a local HTTP fixture server.
+
+Usage: python -m pytest tests
+"""
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain.embeddings import FakeEmbeddings
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from utils import chunking, site_index
+from utils.crawler import Crawler, CrawlStore
+from utils.html_extract import PageExtractor
+
+
+class Site:
+    """
+    Pages served by the fixture server. failures[path] is how many requests for path fail
+    with a 503 (Retry-After: 0) before it is served.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.failures = {}
+        self.requests = Counter()
+        self.not_modified = Counter()
+
+
+@pytest.fixture
+def site():
+    site = Site()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            site.requests[self.path] += 1
+            if site.failures.get(self.path, 0) > 0:
+                site.failures[self.path] -= 1
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            etag = f'"{hash(site.pages[self.path])}"'
+            if self.headers.get("If-None-Match") == etag:
+                site.not_modified[self.path] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            if self.path.endswith(".xml"):
+                body = site.pages[self.path].encode()
+            else:
+                body = f"<html><header>nav</header><p>{site.pages[self.path]}</p></html>".encode()
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    site.url = f"http://127.0.0.1:{server.server_port}"
+    yield site
+    server.shutdown()
+
+
+def make_crawler(tmp_path, **kwargs):
+    store = CrawlStore(path=str(tmp_path / "crawler.sqlite"))
+    return Crawler(store=store, requests_per_second=1000, backoff=0.01, **kwargs)
+
+
+def texts(docs):
+    return {doc.metadata["source"]: doc.page_content.strip() for doc in docs}
+
+
+def test_conditional_requests_reuse_stored_bodies(site, tmp_path):
+    site.pages = {"/a": "page a", "/b": "page b"}
+    entries = {f"{site.url}/a": "2024-01-01", f"{site.url}/b": None}
+    crawler = make_crawler(tmp_path)
+
+    first = crawler.crawl("first", entries, PageExtractor())
+    second = crawler.crawl("second", entries, PageExtractor())
+
+    assert texts(first) == texts(second) == {
+        f"{site.url}/a": "page a",
+        f"{site.url}/b": "page b",
+    }
+    assert first[0].metadata["lastmod"] == "2024-01-01"
+    assert site.not_modified == {"/a": 1, "/b": 1}
+
+
+def test_retries_after_retry_after(site, tmp_path):
+    site.pages = {"/a": "page a"}
+    site.failures = {"/a": 2}
+
+    docs = make_crawler(tmp_path).crawl("crawl", {f"{site.url}/a": None}, PageExtractor())
+
+    assert texts(docs) == {f"{site.url}/a": "page a"}
+    assert site.requests["/a"] == 3
+
+
+def test_interrupted_crawl_resumes_from_frontier(site, tmp_path):
+    site.pages = {"/a": "page a", "/b": "page b"}
+    site.failures = {"/b": 1}
+    entries = {f"{site.url}/a": None, f"{site.url}/b": None}
+    crawler = make_crawler(tmp_path, max_retries=0)
+
+    docs = crawler.crawl("crawl", entries, PageExtractor())
+    assert texts(docs) == {f"{site.url}/a": "page a"}
+    assert crawler.store.done_urls("crawl") == {f"{site.url}/a"}
+
+    docs = crawler.crawl("crawl", entries, PageExtractor())
+    assert texts(docs) == {f"{site.url}/a": "page a", f"{site.url}/b": "page b"}
+    # /a was done, so its stored body is reused without another request.
+    assert site.requests == {"/a": 1, "/b": 2}
+    # Every page fetched: the frontier is cleared.
+    assert crawler.store.done_urls("crawl") == set()
+
+
+def test_site_index_keeps_pages_that_fail_and_clears_the_frontier(site, tmp_path, monkeypatch):
+    # The real splitters need tiktoken's encodings.
+    monkeypatch.setattr(
+        chunking,
+        "get_splitter",
+        lambda config: RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=0),
+    )
+    # The chunk cache lives under ./.cache.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(site_index, "INDEX_DIR", str(tmp_path / "site_index"))
+    store = CrawlStore(path=str(tmp_path / "crawler.sqlite"))
+
+    def sitemap(lastmods):
+        urls = "".join(
+            f"<url><loc>{site.url}/{path}</loc><lastmod>{lastmod}</lastmod></url>"
+            for path, lastmod in lastmods.items()
+        )
+        return f"<urlset>{urls}</urlset>"
+
+    def load():
+        vector_store, _, version = site_index.load_site_index(
+            f"{site.url}/sitemap.xml",
+            None,
+            PageExtractor(),
+            {"kind": "recursive", "chunk_size": 1000, "chunk_overlap": 0},
+            FakeEmbeddings(size=8),
+            crawler_options={"store": store, "max_retries": 0, "backoff": 0.01},
+        )
+        contents = sorted(doc.page_content.strip() for doc in vector_store.docstore._dict.values())
+        return contents, version
+
+    site.pages = {"/sitemap.xml": sitemap({"a": 1, "b": 1}), "/a": "a v1", "/b": "b v1"}
+    assert load() == (["a v1", "b v1"], 1)
+
+    # b changes but fails to fetch: its old chunks stay until it can be fetched again.
+    site.pages.update({"/sitemap.xml": sitemap({"a": 2, "b": 2}), "/a": "a v2", "/b": "b v2"})
+    site.failures = {"/b": 1}
+    assert load() == (["a v2", "b v1"], 2)
+    assert load() == (["a v2", "b v2"], 3)
+
+    assert store.conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0] == 0
@@ -0,0 +1,151 @@
+"""
+Checks GatewayTransport with the openai client against a fake OpenAI API (httpx.MockTransport).
+
+Usage: python -m pytest tests
+"""
+import json
+import threading
+import time
+
+import httpx
+import openai
+
+from utils.concurrency import TokenBucket, map_concurrently
+from utils.llm_gateway import GatewayTransport, ResponseCache
+
+
+class FakeOpenAI:
+    def __init__(self, fail_first=0, delay=0):
+        self.calls = []
+        self.fail_first = fail_first
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        body = json.loads(request.read())
+        with self.lock:
+            self.calls.append((request.url.path, body))
+            count = len(self.calls)
+        if count <= self.fail_first:
+            return httpx.Response(429, headers={"retry-after": "0"}, json={})
+        time.sleep(self.delay)
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(
+                200,
+                json={
+                    "object": "list",
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": [0.1, 0.2]}
+                        for i, _ in enumerate(body["input"])
+                    ],
+                    "model": body["model"],
+                    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                },
+            )
+        if body.get("stream"):
+            chunks = [
+                {
+                    "id": "chunk",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {"index": 0, "delta": {"content": word}, "finish_reason": None}
+                    ],
+                }
+                for word in ["Hel", "lo"]
+            ]
+            stream = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks)
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=(stream + "data: [DONE]\n\n").encode("utf-8"),
+            )
+        return httpx.Response(
+            200,
+            json={
+                "id": "completion",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": f"answer {count}"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            },
+        )
+
+
+def make_client(fake, tmp_path):
+    transport = GatewayTransport(
+        TokenBucket(1000),
+        cache=ResponseCache(path=str(tmp_path / "llm.sqlite")),
+        transport=httpx.MockTransport(fake),
+    )
+    return openai.OpenAI(
+        api_key="sk-test",
+        base_url="http://fake-openai/v1",
+        max_retries=0,
+        http_client=httpx.Client(transport=transport),
+    )
+
+
+def chat(client, content, temperature=0.1, **kwargs):
+    return client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": content}],
+        temperature=temperature,
+        **kwargs,
+    )
+
+
+def test_identical_requests_in_flight_are_coalesced(tmp_path):
+    fake = FakeOpenAI(delay=0.2)
+    client = make_client(fake, tmp_path)
+
+    outcomes = map_concurrently(lambda _: chat(client, "hi"), range(5))
+
+    assert [error for _, error in outcomes] == [None] * 5
+    assert {result.choices[0].message.content for result, _ in outcomes} == {"answer 1"}
+    assert len(fake.calls) == 1
+
+
+def test_low_temperature_completions_are_cached(tmp_path):
+    fake = FakeOpenAI()
+    client = make_client(fake, tmp_path)
+
+    first = chat(client, "hi")
+    second = chat(client, "hi")
+    assert first.choices[0].message.content == second.choices[0].message.content
+    assert len(fake.calls) == 1
+
+    chat(client, "hi", temperature=0.9)
+    chat(client, "hi", temperature=0.9)
+    assert len(fake.calls) == 3
+
+    # Embeddings are left to CachedEmbeddings.
+    for _ in range(2):
+        client.embeddings.create(model="text-embedding-ada-002", input=["a"])
+    assert len(fake.calls) == 5
+
+
+def test_streamed_responses_are_replayed(tmp_path):
+    fake = FakeOpenAI()
+    client = make_client(fake, tmp_path)
+
+    for _ in range(2):
+        chunks = chat(client, "hi", stream=True)
+        assert "".join(chunk.choices[0].delta.content or "" for chunk in chunks) == "Hello"
+    assert len(fake.calls) == 1
+
+
+def test_rate_limited_requests_are_retried(tmp_path):
+    fake = FakeOpenAI(fail_first=2)
+    client = make_client(fake, tmp_path)
+
+    assert chat(client, "hi").choices[0].message.content == "answer 3"
+    assert len(fake.calls) == 3
@@ -0,0 +1,122 @@
+"""
+Checks WikipediaClient against a local stub of the MediaWiki API.
+
+Usage: python -m pytest tests
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from utils.wikipedia import WikipediaClient
+
+
+class Wiki:
+    """
+    Articles served by the stub API as title -> (revid, text).
+    Requests for a title in failing get a 500. requests records (title, prop) for each query.
+    """
+
+    def __init__(self):
+        self.articles = {}
+        self.failing = set()
+        self.requests = []
+
+    def query(self, params):
+        if "srsearch" in params:
+            titles = [
+                title for title in self.articles if params["srsearch"].lower() in title.lower()
+            ]
+            return {"query": {"search": [{"title": title} for title in titles]}}
+        title, prop = params["titles"], params["prop"]
+        self.requests.append((title, prop))
+        if title in self.failing:
+            return None
+        if title not in self.articles:
+            return {"query": {"pages": [{"title": title, "missing": True}]}}
+        revid, text = self.articles[title]
+        page = {
+            "title": title,
+            "revisions": [{"revid": revid}],
+            "fullurl": f"https://en.wikipedia.org/wiki/{title}",
+        }
+        if "extracts" in prop:
+            page["extract"] = text
+        return {"query": {"pages": [page]}}
+
+
+@pytest.fixture
+def wiki():
+    wiki = Wiki()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            params = {
+                key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()
+            }
+            data = wiki.query(params)
+            if data is None:
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    wiki.url = f"http://127.0.0.1:{server.server_port}/w/api.php"
+    yield wiki
+    server.shutdown()
+
+
+def make_client(wiki, tmp_path, **kwargs):
+    return WikipediaClient(
+        api_url=wiki.url, cache_path=str(tmp_path / "wikipedia.sqlite"), **kwargs
+    )
+
+
+def test_articles_within_ttl_come_from_the_cache(wiki, tmp_path):
+    wiki.articles = {"Python": (1, "Python is a language.\n== History ==\nOld.")}
+    client = make_client(wiki, tmp_path)
+
+    assert client.get_article("Python")["content"].startswith("Python is a language.")
+    assert client.get_article("python")["revid"] == 1
+    assert wiki.requests == [("Python", "extracts|revisions|info")]
+
+    docs = client.get_documents("python")
+    assert docs[0].metadata["summary"] == "Python is a language."
+    assert len(wiki.requests) == 1
+
+
+def test_after_ttl_only_the_revision_is_checked(wiki, tmp_path):
+    wiki.articles = {"Python": (1, "First text.")}
+    client = make_client(wiki, tmp_path, ttl=0)
+    client.get_article("Python")
+
+    # Same revision: a revision-only request, and the stored text is kept.
+    wiki.articles["Python"] = (1, "Text the client should not download.")
+    assert client.get_article("Python")["content"] == "First text."
+    assert wiki.requests[1:] == [("Python", "revisions|info")]
+
+    # New revision: the text is downloaded again.
+    wiki.articles["Python"] = (2, "Second text.")
+    assert client.get_article("Python")["content"] == "Second text."
+    assert wiki.requests[2:] == [("Python", "revisions|info"), ("Python", "extracts|revisions|info")]
+
+
+def test_a_failing_title_is_dropped_without_failing_the_rest(wiki, tmp_path):
+    wiki.articles = {"A": (1, "a"), "B": (1, "b"), "C": (1, "c")}
+    wiki.failing = {"B"}
+    client = make_client(wiki, tmp_path)
+
+    articles = client.get_articles(["A", "B", "Missing", "C"])
+    assert [article["title"] for article in articles] == ["A", "C"]
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AnswerCache:
+    """
+    In-memory cache of final answers, looked up by question embedding.
+    A question hits when its cosine similarity to a cached question is at least threshold.
+    Entries belong to one version of a site index and are dropped when that version changes.
+    """
+
+    def __init__(self, threshold=0.95, ttl=60 * 60, max_entries=500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _invalidate(self, site, version):
+        if self.versions.get(site) == version:
+            return
+        self.versions[site] = version
+        for id in [id for id, entry in self.entries.items() if entry["site"] == site]:
+            del self.entries[id]
+
+    def get(self, site, version, vector):
+        vector = self._normalize(vector)
+        now = time.time()
+        with self.lock:
+            self._invalidate(site, version)
+            best_id, best_score = None, self.threshold
+            for id, entry in list(self.entries.items()):
+                if now - entry["created"] > self.ttl:
+                    del self.entries[id]
+                    continue
+                if entry["site"] != site:
+                    continue
+                score = float(np.dot(vector, entry["vector"]))
+                if score >= best_score:
+                    best_id, best_score = id, score
+            if best_id is None:
+                return None
+            self.entries.move_to_end(best_id)
+            entry = self.entries[best_id]
+            return {"answer": entry["answer"], "sources": entry["sources"]}
+
+    def put(self, site, version, vector, answer, sources):
+        with self.lock:
+            self._invalidate(site, version)
+            self.entries[self.next_id] = {
+                "site": site,
+                "vector": self._normalize(vector),
+                "answer": answer,
+                "sources": sources,
+                "created": time.time(),
+            }
+            self.next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
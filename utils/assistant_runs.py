@@ -0,0 +1,69 @@
+import json
+import time
+
+from utils.concurrency import map_concurrently
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete"}
+
+
+def execute_tool_calls(tool_calls, functions_map, max_workers=8, timeout=60):
+    """
+    Runs the tool calls of a required action concurrently.
+    A call that fails or times out reports its error as its output, so the run can go on.
+    """
+
+    def call(tool_call):
+        function = tool_call.function
+        print(f"Calling function: {function.name} with arg {function.arguments}")
+        return functions_map[function.name](json.loads(function.arguments))
+
+    outcomes = map_concurrently(call, tool_calls, max_workers=max_workers, timeout=timeout)
+    return [
+        {
+            "tool_call_id": tool_call.id,
+            "output": str(result) if error is None else f"Error: {error!r}",
+        }
+        for tool_call, (result, error) in zip(tool_calls, outcomes)
+    ]
+
+
+def run_until_done(
+    client,
+    thread_id,
+    run_id,
+    functions_map,
+    deadline=300,
+    poll_interval=0.5,
+    max_poll_interval=5,
+    on_status=None,
+):
+    """
+    Drives an Assistants run to a terminal state and returns the final run.
+    Polls with exponential backoff, runs each required action's tool calls concurrently
+    and submits their outputs as soon as they are all ready.
+    The run is cancelled and TimeoutError raised once deadline seconds have passed.
+    """
+    started = time.monotonic()
+    interval = poll_interval
+    while True:
+        run = client.beta.threads.runs.retrieve(run_id=run_id, thread_id=thread_id)
+        if on_status:
+            on_status(run)
+        if run.status in TERMINAL_STATUSES:
+            return run
+        if time.monotonic() - started > deadline:
+            client.beta.threads.runs.cancel(run_id=run_id, thread_id=thread_id)
+            raise TimeoutError(f"Run {run_id} did not finish in {deadline}s")
+        if run.status == "requires_action":
+            outputs = execute_tool_calls(
+                run.required_action.submit_tool_outputs.tool_calls, functions_map
+            )
+            client.beta.threads.runs.submit_tool_outputs(
+                run_id=run_id,
+                thread_id=thread_id,
+                tool_outputs=outputs,
+            )
+            interval = poll_interval
+            continue
+        time.sleep(interval)
+        interval = min(interval * 2, max_poll_interval)
@@ -0,0 +1,98 @@
+import json
+import math
+import os
+from collections import Counter
+
+import numpy as np
+from langchain.schema import BaseRetriever
+
+from utils.rerank import tokenize
+
+
+class BM25Index:
+    """
+    Inverted index over the same chunks as the FAISS store, keyed by the same docstore ids.
+    """
+
+    def __init__(self, postings=None, lengths=None, k1=1.5, b=0.75):
+        self.postings = postings or {}
+        self.lengths = lengths or {}
+        self.k1 = k1
+        self.b = b
+
+    def add(self, ids, texts):
+        for id, text in zip(ids, texts):
+            terms = Counter(tokenize(text))
+            self.lengths[id] = sum(terms.values())
+            for term, count in terms.items():
+                self.postings.setdefault(term, {})[id] = count
+
+    def delete(self, ids):
+        ids = set(ids) & set(self.lengths)
+        if not ids:
+            return
+        for id in ids:
+            del self.lengths[id]
+        for term in list(self.postings):
+            posting = self.postings[term]
+            for id in ids & posting.keys():
+                del posting[id]
+            if not posting:
+                del self.postings[term]
+
+    def search(self, query, k=20):
+        if not self.lengths:
+            return []
+        total = len(self.lengths)
+        average_length = sum(self.lengths.values()) / total
+        scores = Counter()
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+            for id, tf in posting.items():
+                norm = 1 - self.b + self.b * self.lengths[id] / average_length
+                scores[id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores.most_common(k)
+
+    def save(self, path):
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"postings": self.postings, "lengths": self.lengths}, f)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["postings"], data["lengths"])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses FAISS and BM25 rankings with reciprocal rank fusion.
+    """
+
+    vector_store: object
+    bm25: object
+    embeddings: object
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def dense_ids(self, query):
+        vector = np.array([self.embeddings.embed_query(query)], dtype=np.float32)
+        _, indices = self.vector_store.index.search(vector, self.fetch_k)
+        return [
+            self.vector_store.index_to_docstore_id[i] for i in indices[0] if i != -1
+        ]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        scores = Counter()
+        sparse_ids = [id for id, _ in self.bm25.search(query, self.fetch_k)]
+        for ranking in (self.dense_ids(query), sparse_ids):
+            for rank, id in enumerate(ranking):
+                scores[id] += 1 / (self.rrf_k + rank + 1)
+        return [
+            self.vector_store.docstore.search(id) for id, _ in scores.most_common(self.k)
+        ]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+from functools import lru_cache
+
+from langchain.schema import Document
+from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+from utils.concurrency import map_in_processes
+
+CHUNK_CACHE_PATH = "./.cache/chunks.sqlite"
+
+# Part of every cache key. Bumped to 2 to ignore chunks stored under the wrong key by the duplicate-document bug.
+CHUNK_CACHE_VERSION = 2
+
+# Splitting a document is quick next to a spawned worker importing langchain.
+MIN_DOCS_FOR_POOL = 8
+
+
+@lru_cache(maxsize=None)
+def _get_splitter(config):
+    config = dict(config)
+    kind = config.pop("kind")
+    if kind == "recursive":
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(**config)
+    if kind == "character":
+        return CharacterTextSplitter.from_tiktoken_encoder(**config)
+    raise ValueError(f"Unknown splitter kind: {kind}")
+
+
+def get_splitter(config):
+    """
+    Returns the splitter for config, e.g. {"kind": "recursive", "chunk_size": 1000, "chunk_overlap": 200}.
+    Splitters (and their tiktoken encoders) are built once per process.
+    """
+    return _get_splitter(tuple(sorted(config.items())))
+
+
+def _split_text(args):
+    text, config = args
+    return get_splitter(config).split_text(text)
+
+
+def _cache_key(text, config):
+    digest = hashlib.sha256(f"{CHUNK_CACHE_VERSION}\0{text}".encode("utf-8"))
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _connect(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS chunks (key TEXT NOT NULL PRIMARY KEY, chunks TEXT NOT NULL)"
+    )
+    return conn
+
+
+def iter_split_documents(docs, config, max_workers=None, path=CHUNK_CACHE_PATH):
+    """
+    Splits docs with the splitter described by config and yields the chunks in order,
+    as soon as each document is split.
+    Chunks are cached by (document hash, splitter config), and cache misses are split in a process pool.
+    """
+    docs = list(docs)
+    keys = [_cache_key(doc.page_content, config) for doc in docs]
+    conn = _connect(path)
+    try:
+        cached = {}
+        for i in range(0, len(keys), 900):
+            batch = keys[i : i + 900]
+            rows = conn.execute(
+                f"SELECT key, chunks FROM chunks WHERE key IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            cached.update((key, json.loads(chunks)) for key, chunks in rows)
+
+        # One entry per distinct key: documents with the same content are split once.
+        misses = {}
+        for doc, key in zip(docs, keys):
+            if key not in cached:
+                misses.setdefault(key, doc.page_content)
+        splits = map_in_processes(
+            _split_text,
+            [(text, config) for text in misses.values()],
+            MIN_DOCS_FOR_POOL,
+            max_workers,
+        )
+        results = zip(misses, splits)
+
+        try:
+            for doc, key in zip(docs, keys):
+                # Misses are split in the order their keys first appear, so the next result is this key's.
+                if key not in cached:
+                    miss_key, texts = next(results)
+                    cached[miss_key] = texts
+                    conn.execute(
+                        "INSERT OR REPLACE INTO chunks VALUES (?, ?)",
+                        (miss_key, json.dumps(texts)),
+                    )
+                    conn.commit()
+                for text in cached[key]:
+                    yield Document(page_content=text, metadata=dict(doc.metadata))
+        finally:
+            splits.close()
+    finally:
+        conn.close()
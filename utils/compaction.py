@@ -0,0 +1,79 @@
+import json
+import re
+
+from utils.rerank import STOPWORDS, lexical_overlap, tokenize
+from utils.tokens import count_tokens
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _compact_table(table, max_tokens, tail=False):
+    # Tables from to_compact ({"columns", "index", "data"}): drop the last rows until it fits,
+    # or the first ones if tail (e.g. a price history, where the newest rows matter most).
+    total = len(table["data"])
+    while table["data"] and count_tokens(json.dumps(table)) > max_tokens:
+        drop = slice(1, None) if tail else slice(None, -1)
+        table["index"] = table["index"][drop]
+        table["data"] = table["data"][drop]
+        table["truncated_rows"] = total - len(table["data"])
+    return json.dumps(table)
+
+
+def _compact_text(text, query, max_tokens):
+    sentences = []
+    seen = set()
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        key = " ".join(tokenize(sentence))
+        if not sentence or key in seen:
+            continue
+        seen.add(key)
+        sentences.append(sentence)
+
+    query_terms = set(tokenize(query)) - STOPWORDS
+    # Earlier sentences win ties: the top of a search result or article summary matters most.
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (lexical_overlap(query_terms, sentences[i]), -i),
+        reverse=True,
+    )
+    kept = set()
+    used = 0
+    for i in ranked:
+        tokens = count_tokens(sentences[i]) + 1
+        if used + tokens > max_tokens:
+            continue
+        kept.add(i)
+        used += tokens
+
+    parts = []
+    for i, sentence in enumerate(sentences):
+        if i in kept:
+            parts.append(sentence)
+        elif not parts or parts[-1] != "[...]":
+            parts.append("[...]")
+    return " ".join(parts)
+
+
+def compact_output(text, query, max_tokens, tail=False):
+    """
+    Fits a tool output into max_tokens tokens before it goes back to the assistant.
+    JSON tables lose their last rows (their first rows if tail). Text is deduplicated by sentence and the sentences
+    most relevant to query are kept, in their original order, with [...] where text was cut.
+    Returns (text, tokens_before, tokens_after).
+    """
+    before = count_tokens(text)
+    if before <= max_tokens:
+        return text, before, before
+    # Leave room for the truncation marker.
+    budget = max_tokens - 20
+    try:
+        table = json.loads(text)
+    except ValueError:
+        table = None
+    if isinstance(table, dict) and {"index", "data"} <= table.keys():
+        compacted = _compact_table(table, budget, tail)
+    else:
+        compacted = _compact_text(text, query, budget)
+        compacted += f"\n[truncated: kept about {count_tokens(compacted)} of {before} tokens]"
+    return compacted, before, count_tokens(compacted)
@@ -0,0 +1,170 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+
+def iter_concurrently(fn, items, max_workers=8, timeout=None):
+    """
+    Runs fn over items in a thread pool and yields (index, result, error) as each call finishes,
+    so one slow or failed call doesn't hold back or sink the others.
+    timeout is measured per call, from the moment the call actually starts.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    started = {}
+
+    def run(index, item):
+        started[index] = time.monotonic()
+        return fn(item)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(run, i, item): i for i, item in enumerate(items)}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=0.05 if timeout else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+            if timeout is None:
+                continue
+            now = time.monotonic()
+            for future in list(pending):
+                index = futures[future]
+                if index in started and now - started[index] > timeout:
+                    pending.discard(future)
+                    future.cancel()
+                    yield index, None, TimeoutError(f"Call timed out after {timeout}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def map_concurrently(fn, items, max_workers=8, timeout=None, on_result=None):
+    """
+    Runs fn over items in a thread pool.
+    Returns a list of (result, error) tuples in the same order as items.
+    on_result(index, result, error) is called in the caller's thread as each call finishes.
+    """
+    items = list(items)
+    outcomes = [(None, None)] * len(items)
+    for index, result, error in iter_concurrently(fn, items, max_workers, timeout):
+        outcomes[index] = (result, error)
+        if on_result:
+            on_result(index, result, error)
+    return outcomes
+
+
+def map_in_processes(fn, items, min_items, max_workers=None, chunksize=1):
+    """
+    Yields fn(item) for every item, in order.
+    Batches of at least min_items are spread over a process pool; smaller ones are mapped
+    in this process, since they would be done before the pool's workers had started.
+    fn and items must be picklable.
+    """
+    items = list(items)
+    if len(items) < min_items:
+        yield from map(fn, items)
+        return
+    # spawn, not fork: forking the multi-threaded Streamlit server can deadlock the child.
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    try:
+        yield from executor.map(fn, items, chunksize=chunksize)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def batched(iterable, size):
+    """
+    Yields lists of size items from iterable, the last one possibly shorter.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TokenBucket:
+    """
+    Lets rate requests per second through, with bursts of up to capacity.
+    Thread-safe, with a blocking acquire() for threads and acquire_async() for asyncio code.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        # Takes a token and returns 0, or returns how long to wait for the next one.
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while wait_for := self._take():
+            time.sleep(wait_for)
+
+    async def acquire_async(self):
+        while wait_for := self._take():
+            await asyncio.sleep(wait_for)
+
+
+class Coalescer:
+    """
+    Identical calls in flight at the same time share one execution:
+    run(key, fn) calls fn unless a call for key is already running, in which case it waits
+    for that one and returns its result (or raises its exception).
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def run(self, key, fn):
+        with self.lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import random
+import sqlite3
+from urllib.parse import urlparse
+
+import aiohttp
+from langchain.schema import Document
+
+from utils.concurrency import TokenBucket
+from utils.html_extract import extract_many
+
+CRAWL_DB_PATH = "./.cache/crawler.sqlite"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CrawlStore:
+    """
+    SQLite store for the crawler.
+    validators keeps ETag / Last-Modified and the last body of every URL, for conditional requests.
+    frontier keeps the URLs of each crawl and whether they are done, so an interrupted crawl can resume.
+    """
+
+    def __init__(self, path=CRAWL_DB_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS validators (
+            url TEXT NOT NULL PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body BLOB
+            );
+            CREATE TABLE IF NOT EXISTS frontier (
+            crawl_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (crawl_id, url)
+            );
+            """
+        )
+        self.conn.commit()
+
+    def get_validator(self, url):
+        return self.conn.execute(
+            "SELECT etag, last_modified, body FROM validators WHERE url = ?", (url,)
+        ).fetchone()
+
+    def save_validator(self, url, etag, last_modified, body):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?)",
+            (url, etag, last_modified, body),
+        )
+        self.conn.commit()
+
+    def add_to_frontier(self, crawl_id, urls):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO frontier (crawl_id, url) VALUES (?, ?)",
+            [(crawl_id, url) for url in urls],
+        )
+        self.conn.commit()
+
+    def done_urls(self, crawl_id):
+        return {
+            url
+            for (url,) in self.conn.execute(
+                "SELECT url FROM frontier WHERE crawl_id = ? AND done = 1", (crawl_id,)
+            )
+        }
+
+    def mark_done(self, crawl_id, url):
+        self.conn.execute(
+            "UPDATE frontier SET done = 1 WHERE crawl_id = ? AND url = ?",
+            (crawl_id, url),
+        )
+        self.conn.commit()
+
+    def clear_frontier(self, crawl_id):
+        self.conn.execute("DELETE FROM frontier WHERE crawl_id = ?", (crawl_id,))
+        self.conn.commit()
+
+
+class Crawler:
+    def __init__(
+        self,
+        store=None,
+        requests_per_second=20,
+        burst=40,
+        max_connections=20,
+        max_retries=3,
+        backoff=0.5,
+        timeout=30,
+    ):
+        self.store = store or CrawlStore()
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.buckets = {}
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.requests_per_second, self.burst)
+        return self.buckets[host]
+
+    async def fetch(self, session, url):
+        """
+        Returns the body of url, using a conditional request when a validator is stored.
+        """
+        validator = self.store.get_validator(url)
+        headers = {}
+        if validator:
+            etag, last_modified, _ = validator
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket(url).acquire_async()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and validator:
+                        return validator[2]
+                    if response.status in RETRY_STATUSES and attempt < self.max_retries:
+                        retry_after = response.headers.get("Retry-After", "")
+                        delay = float(retry_after) if retry_after.isdigit() else None
+                        await self.sleep(attempt, delay)
+                        continue
+                    response.raise_for_status()
+                    body = await response.read()
+                    self.store.save_validator(
+                        url,
+                        response.headers.get("ETag"),
+                        response.headers.get("Last-Modified"),
+                        body,
+                    )
+                    return body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                await self.sleep(attempt)
+
+    async def sleep(self, attempt, delay=None):
+        if delay is None:
+            delay = self.backoff * 2**attempt
+        await asyncio.sleep(delay + random.uniform(0, self.backoff))
+
+    async def crawl_async(self, crawl_id, urls):
+        self.store.add_to_frontier(crawl_id, urls)
+        done = self.store.done_urls(crawl_id)
+        bodies = {}
+        for url in done:
+            validator = self.store.get_validator(url)
+            if validator:
+                bodies[url] = validator[2]
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            keepalive_timeout=60,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+
+            async def fetch_one(url):
+                try:
+                    bodies[url] = await self.fetch(session, url)
+                except Exception as e:
+                    print(f"Error fetching {url}: {e!r}")
+                    return
+                self.store.mark_done(crawl_id, url)
+
+            await asyncio.gather(*(fetch_one(url) for url in urls if url not in bodies))
+        return bodies
+
+    def crawl(self, crawl_id, entries, extractor):
+        """
+        Fetches every {loc: lastmod} entry and returns one Document per page,
+        with the same metadata SitemapLoader gives.
+        Pages that keep failing are skipped and retried on the next crawl.
+        """
+        bodies = asyncio.run(self.crawl_async(crawl_id, list(entries)))
+        locs = [loc for loc in entries if loc in bodies]
+        texts = extract_many(extractor, [bodies[loc] for loc in locs])
+        docs = []
+        for loc, text in zip(locs, texts):
+            metadata = {"source": loc, "loc": loc}
+            if entries[loc]:
+                metadata["lastmod"] = entries[loc]
+            docs.append(Document(page_content=text, metadata=metadata))
+        if len(docs) == len(entries):
+            self.store.clear_frontier(crawl_id)
+        return docs
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from langchain.schema import Document
+
+STORE_DIR = "./.cache/quiz_files"
+MAX_STORE_BYTES = 2 * 1024**3
+
+
+class DocumentStore:
+    """
+    Content-addressed store for uploaded files.
+    Every upload lives in STORE_DIR/<sha256 of its bytes>/ with the raw file,
+    its extracted text and its chunks, so the same file is parsed only once whoever uploads it.
+    The least recently used uploads are evicted once the store grows past max_bytes.
+    """
+
+    def __init__(self, root=STORE_DIR, max_bytes=MAX_STORE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _write(self, path, data):
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def touch(self, key):
+        try:
+            os.utime(self._dir(key))
+        except FileNotFoundError:
+            pass
+
+    def put_raw(self, content, filename):
+        """
+        Stores the upload and returns its key.
+        The original extension is kept, since the loaders pick a parser from it.
+        """
+        key = hashlib.sha256(content).hexdigest()
+        directory = self._dir(key)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"raw{os.path.splitext(filename)[1].lower()}")
+        if not os.path.exists(path):
+            self._write(path, content)
+            self.evict(keep=key)
+        self.touch(key)
+        return key
+
+    def raw_path(self, key):
+        for name in os.listdir(self._dir(key)):
+            if name.startswith("raw") and not name.endswith(".tmp"):
+                return os.path.join(self._dir(key), name)
+        raise FileNotFoundError(key)
+
+    def load_docs(self, key, name):
+        try:
+            with open(os.path.join(self._dir(key), f"{name}.json")) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        self.touch(key)
+        return [Document(**doc) for doc in data]
+
+    def save_docs(self, key, name, docs):
+        data = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+        path = os.path.join(self._dir(key), f"{name}.json")
+        self._write(path, json.dumps(data, default=str).encode("utf-8"))
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        with self.lock:
+            entries = []
+            total = 0
+            for key in os.listdir(self.root):
+                directory = self._dir(key)
+                if not os.path.isdir(directory):
+                    continue
+                size = sum(
+                    os.path.getsize(os.path.join(directory, name))
+                    for name in os.listdir(directory)
+                )
+                total += size
+                if key != keep:
+                    entries.append((os.path.getmtime(directory), size, directory))
+            for _, size, directory in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(directory, ignore_errors=True)
+                total -= size
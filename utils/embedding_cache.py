@@ -0,0 +1,95 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+CACHE_PATH = "./.cache/embeddings.sqlite"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Puts a SQLite store in front of another Embeddings.
+    Vectors are keyed by model name plus the SHA-256 of the text,
+    so unchanged chunks are never embedded twice, whichever page or process asks for them.
+    """
+
+    def __init__(self, embeddings, path=CACHE_PATH, batch_size=500):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model, hash)
+            )
+            """
+        )
+        self.conn.commit()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _hash(self, text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes):
+        found = {}
+        unique = list(set(hashes))
+        with self.lock:
+            # Stay under SQLite's limit on bound parameters.
+            for i in range(0, len(unique), 900):
+                chunk = unique[i : i + 900]
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(chunk))})",
+                    [self.model, *chunk],
+                )
+                for hash, vector in rows:
+                    found[hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [
+                    (self.model, hash, np.asarray(vector, dtype=np.float32).tobytes())
+                    for hash, vector in items
+                ],
+            )
+            self.conn.commit()
+
+    def embed_documents(self, texts):
+        hashes = [self._hash(text) for text in texts]
+        found = self._lookup(hashes)
+        missing = {}
+        for text, hash in zip(texts, hashes):
+            if hash not in found:
+                missing.setdefault(hash, text)
+        self.hits += len(texts) - sum(1 for hash in hashes if hash in missing)
+        self.misses += sum(1 for hash in hashes if hash in missing)
+
+        missing = list(missing.items())
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i : i + self.batch_size]
+            vectors = self.embeddings.embed_documents([text for _, text in batch])
+            items = [(hash, vector) for (hash, _), vector in zip(batch, vectors)]
+            self._store(items)
+            found.update(items)
+        return [list(found[hash]) for hash in hashes]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,65 @@
+import re
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from utils.concurrency import map_in_processes
+
+# Boilerplate to strip per site, on top of the default header and footer.
+SITE_RULES = {
+    "developers.cloudflare.com": {
+        "strip_strings": ["CloseSearch Submit Blog"],
+    },
+}
+
+# A spawned worker re-imports bs4 before its first page, so small batches stay in this process.
+MIN_PAGES_FOR_POOL = 20
+
+
+class PageExtractor:
+    """
+    Turns an HTML page into plain text.
+    Tags in strip_tags are removed before extracting the text.
+    strip_strings removal and whitespace normalization happen in one regex pass over the text.
+    """
+
+    def __init__(self, strip_tags=("header", "footer"), strip_strings=()):
+        self.strip_tags = tuple(strip_tags)
+        self.strip_strings = tuple(strip_strings)
+        # Strip strings come first so they win over plain whitespace at the same position,
+        # and match any whitespace between their words.
+        alternatives = [
+            r"\s+".join(re.escape(word) for word in string.split())
+            for string in self.strip_strings
+        ]
+        alternatives.append(r"(?P<space>\s+)")
+        self.pattern = re.compile("|".join(alternatives))
+
+    def _replace(self, match):
+        return " " if match.group("space") else ""
+
+    def __call__(self, soup):
+        for name in self.strip_tags:
+            tag = soup.find(name)
+            if tag:
+                tag.decompose()
+        return self.pattern.sub(self._replace, soup.get_text())
+
+    def extract_html(self, html):
+        return self(BeautifulSoup(html, "lxml"))
+
+
+def extractor_for(url):
+    return PageExtractor(**SITE_RULES.get(urlparse(url).netloc, {}))
+
+
+def extract_many(extractor, htmls, max_workers=None):
+    """
+    Extracts the text of every page, in order.
+    Large batches are spread over a process pool.
+    """
+    return list(
+        map_in_processes(
+            extractor.extract_html, htmls, MIN_PAGES_FOR_POOL, max_workers, chunksize=8
+        )
+    )
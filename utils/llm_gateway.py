@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import httpx
+import openai
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings import OpenAIEmbeddings
+
+from utils.concurrency import Coalescer, TokenBucket
+
+MODEL_CONFIG_PATH = "model.json"
+CACHE_PATH = "./.cache/llm.sqlite"
+# Chat completions at or under this temperature are treated as deterministic and cached.
+CACHE_MAX_TEMPERATURE = 0.1
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+REQUESTS_PER_SECOND = float(os.getenv("LLM_REQUESTS_PER_SECOND", 5))
+# model.json options ChatOpenAI has no field for; they go to model_kwargs.
+MODEL_KWARGS = {"top_p", "frequency_penalty", "presence_penalty", "logit_bias"}
+
+
+def load_model_config(path=MODEL_CONFIG_PATH):
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    config.pop("_type", None)
+    return config
+
+
+class ResponseCache:
+    """
+    SQLite store of chat completion bodies, keyed by the SHA-256 of the request.
+    Responses expire after ttl seconds and the least recently used are evicted past max_entries.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=7 * 24 * 60 * 60, max_entries=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # The first version of this cache, unbounded and holding embeddings too.
+        self.conn.execute("DROP TABLE IF EXISTS responses")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+            key TEXT NOT NULL PRIMARY KEY,
+            content_type TEXT,
+            body BLOB NOT NULL,
+            created REAL NOT NULL,
+            last_used REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT content_type, body FROM completions WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE completions SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+        return row
+
+    def put(self, key, content_type, body):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                (key, content_type, body, now, now),
+            )
+            self.conn.execute("DELETE FROM completions WHERE created <= ?", (now - self.ttl,))
+            self.conn.execute(
+                """
+                DELETE FROM completions WHERE key NOT IN (
+                SELECT key FROM completions ORDER BY last_used DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+
+class RecordingStream(httpx.SyncByteStream):
+    """
+    Passes a streamed response through unchanged and stores the whole body once it has been read to the end.
+    """
+
+    def __init__(self, response, on_complete):
+        self.response = response
+        self.on_complete = on_complete
+        self.chunks = []
+        self.finished = False
+
+    def __iter__(self):
+        for chunk in self.response.iter_bytes():
+            self.chunks.append(chunk)
+            yield chunk
+        self.finished = True
+
+    def close(self):
+        self.response.close()
+        if self.finished:
+            self.on_complete(b"".join(self.chunks))
+
+
+class GatewayTransport(httpx.BaseTransport):
+    """
+    httpx transport in front of the OpenAI API.
+    Every request waits for the shared token bucket and is retried with jittered backoff on 429/5xx.
+    Low-temperature chat completions are also served from the response cache,
+    and identical ones that are already in flight wait for the first instead of being sent again.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        cache=None,
+        max_retries=4,
+        backoff=1,
+        max_backoff=30,
+        transport=None,
+    ):
+        self.bucket = bucket
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.transport = transport or httpx.HTTPTransport()
+        self.in_flight = Coalescer()
+
+    def _cacheable(self, request):
+        """
+        Returns the parsed JSON body of a request that may be served from the cache, else None.
+        """
+        if self.cache is None or request.method != "POST":
+            return None
+        # Not /embeddings: CachedEmbeddings already keeps the vectors, far more compactly.
+        if not request.url.path.endswith("/chat/completions"):
+            return None
+        try:
+            body = json.loads(request.read())
+        except ValueError:
+            return None
+        if body.get("temperature", 1) > CACHE_MAX_TEMPERATURE or body.get("n", 1) != 1:
+            return None
+        return body
+
+    def _cache_key(self, request, body):
+        # stream is part of the key: a streamed body can only be replayed to a streaming caller.
+        payload = json.dumps(
+            [str(request.url), body], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _send(self, request):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                self._sleep(attempt)
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            retry_after = response.headers.get("retry-after")
+            response.close()
+            self._sleep(attempt, retry_after)
+
+    def _sleep(self, attempt, retry_after=None):
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            # Full jitter, so sessions that failed together don't retry together.
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        time.sleep(min(delay, self.max_backoff))
+
+    def _cached_response(self, request, content_type, body, hit=True):
+        return httpx.Response(
+            200,
+            headers={"content-type": content_type, "x-llm-cache": "hit" if hit else "miss"},
+            content=body,
+            request=request,
+        )
+
+    def handle_request(self, request):
+        body = self._cacheable(request)
+        if body is None:
+            return self._send(request)
+        key = self._cache_key(request, body)
+
+        cached = self.cache.get(key)
+        if cached:
+            return self._cached_response(request, *cached)
+
+        if body.get("stream"):
+            response = self._send(request)
+            if response.status_code != 200:
+                return response
+            content_type = response.headers.get("content-type")
+            return httpx.Response(
+                200,
+                headers={"content-type": content_type},
+                stream=RecordingStream(
+                    response, lambda body: self.cache.put(key, content_type, body)
+                ),
+                request=request,
+            )
+
+        def fetch():
+            response = self._send(request)
+            body = response.read()
+            response.close()
+            if response.status_code == 200:
+                self.cache.put(key, response.headers.get("content-type"), body)
+            headers = [
+                (name, value)
+                for name, value in response.headers.items()
+                if name not in ("content-encoding", "content-length", "transfer-encoding")
+            ]
+            return response.status_code, headers, body
+
+        # Identical requests in flight share the first one's response (error responses included).
+        status_code, headers, body = self.in_flight.run(key, fetch)
+        if status_code == 200:
+            return self._cached_response(
+                request, dict(headers).get("content-type"), body, hit=False
+            )
+        return httpx.Response(status_code, headers=headers, content=body, request=request)
+
+    def close(self):
+        self.transport.close()
+
+
+bucket = TokenBucket(REQUESTS_PER_SECOND, capacity=REQUESTS_PER_SECOND * 2)
+clients = {}
+clients_lock = threading.Lock()
+
+
+def get_http_client(cache=True):
+    """
+    The process-wide httpx client for OpenAI calls. All clients share one token bucket;
+    cache=False skips the response cache (for callers that want a fresh completion every time).
+    """
+    with clients_lock:
+        if cache not in clients:
+            transport = GatewayTransport(
+                bucket, cache=ResponseCache() if cache else None
+            )
+            clients[cache] = httpx.Client(
+                transport=transport, timeout=httpx.Timeout(600, connect=5)
+            )
+        return clients[cache]
+
+
+def openai_client(model, cache=True):
+    """
+    An OpenAI client for a langchain model's key and base URL that sends through the gateway.
+    """
+    return openai.OpenAI(
+        api_key=model.openai_api_key,
+        organization=model.openai_organization,
+        base_url=model.openai_api_base,
+        # The gateway already retries.
+        max_retries=0,
+        http_client=get_http_client(cache),
+    )
+
+
+def get_chat_model(cache=True, **overrides):
+    """
+    ChatOpenAI built from model.json, with overrides on top, sending through the gateway.
+    """
+    if "model" in overrides:
+        overrides["model_name"] = overrides.pop("model")
+    config = {**load_model_config(), **overrides}
+    # None means "ChatOpenAI's default".
+    config = {key: value for key, value in config.items() if value is not None}
+    model_kwargs = {key: config.pop(key) for key in MODEL_KWARGS & config.keys()}
+    llm = ChatOpenAI(**config, model_kwargs=model_kwargs)
+    # Set after construction: langchain would also hand http_client to its AsyncOpenAI, which needs an async client.
+    # The pages only make sync calls.
+    llm.client = openai_client(llm, cache).chat.completions
+    return llm
+
+
+def get_embeddings_model(**kwargs):
+    embeddings = OpenAIEmbeddings(**kwargs)
+    embeddings.client = openai_client(embeddings).embeddings
+    return embeddings
@@ -0,0 +1,104 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+from langchain.schema import Document
+
+# How many files are parsed at the same time, across all sessions.
+MAX_PARSE_JOBS = 2
+PARSE_TIMEOUT = 300
+PARSE_MEMORY_LIMIT = 2 * 1024**3
+
+_slots = threading.BoundedSemaphore(MAX_PARSE_JOBS)
+
+
+class ParseError(Exception):
+    pass
+
+
+def _limit_memory(memory_limit):
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ImportError, ValueError, OSError):
+        # Not every platform lets us cap the address space.
+        pass
+
+
+def _parse_file(path, results, memory_limit):
+    """
+    Runs in the worker process and sends ("doc", {...}) messages back, one per page.
+    PDFs are read page by page; other files go through unstructured, one document per page.
+    """
+    if memory_limit:
+        _limit_memory(memory_limit)
+    try:
+        if path.lower().endswith(".pdf"):
+            from pypdf import PdfReader
+
+            for number, page in enumerate(PdfReader(path).pages, start=1):
+                results.put(
+                    (
+                        "doc",
+                        {
+                            "page_content": page.extract_text() or "",
+                            "metadata": {"source": path, "page_number": number},
+                        },
+                    )
+                )
+        else:
+            from langchain.document_loaders import UnstructuredFileLoader
+
+            for doc in UnstructuredFileLoader(path, mode="paged").load():
+                results.put(
+                    ("doc", {"page_content": doc.page_content, "metadata": doc.metadata})
+                )
+        results.put(("done", None))
+    except BaseException as e:
+        results.put(("error", repr(e)))
+
+
+def iter_parse_file(
+    path, timeout=PARSE_TIMEOUT, memory_limit=PARSE_MEMORY_LIMIT, cancel_event=None
+):
+    """
+    Parses path in a separate process and yields its pages as Documents while they are extracted.
+    Raises ParseError when the job fails, runs out of memory or takes longer than timeout.
+    The worker process is killed as soon as the caller stops iterating or sets cancel_event,
+    e.g. when Streamlit stops the script because the user navigated away.
+    """
+    with _slots:
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        process = context.Process(
+            target=_parse_file, args=(path, results, memory_limit), daemon=True
+        )
+        process.start()
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ParseError(f"Parsing {path} was cancelled")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ParseError(f"Parsing {path} took longer than {timeout}s")
+                try:
+                    kind, payload = results.get(timeout=min(0.5, remaining))
+                except queue.Empty:
+                    if not process.is_alive() and results.empty():
+                        raise ParseError(
+                            f"Parser exited with code {process.exitcode} while parsing {path}"
+                        )
+                    continue
+                if kind == "doc":
+                    yield Document(**payload)
+                elif kind == "done":
+                    return
+                else:
+                    raise ParseError(f"Could not parse {path}: {payload}")
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join()
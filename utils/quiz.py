@@ -0,0 +1,204 @@
+import re
+from difflib import SequenceMatcher
+
+from utils.tokens import count_tokens
+
+
+def group_docs(docs, group_tokens=3000, max_groups=8):
+    """
+    Packs consecutive chunks into groups of at most group_tokens tokens.
+    When there are more than max_groups groups, keeps max_groups spread evenly over the document,
+    so the total prompt size stays under group_tokens * max_groups.
+    """
+    groups = []
+    group = []
+    used = 0
+    for doc in docs:
+        tokens = count_tokens(doc.page_content)
+        if group and used + tokens > group_tokens:
+            groups.append(group)
+            group = []
+            used = 0
+        group.append(doc)
+        used += tokens
+    if group:
+        groups.append(group)
+    if len(groups) > max_groups:
+        step = len(groups) / max_groups
+        groups = [groups[int(i * step)] for i in range(max_groups)]
+    return groups
+
+
+def normalize_question(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def is_similar(a, b, threshold=0.85):
+    # Compares word sequences, so questions differing in one key word are kept apart.
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+def select_questions(candidates, count):
+    """
+    Reduce step of the quiz map-reduce.
+    candidates is one list of questions per chunk group.
+    Picks questions round-robin across groups, so the quiz covers the whole document,
+    and skips near-duplicates of questions already picked.
+    """
+    selected = []
+    seen = []
+    queues = [list(questions) for questions in candidates]
+    while len(selected) < count and any(queues):
+        for queue in queues:
+            while queue:
+                question = queue.pop(0)
+                normalized = normalize_question(question["question"])
+                if any(is_similar(normalized, other) for other in seen):
+                    continue
+                seen.append(normalized)
+                selected.append(question)
+                break
+            if len(selected) == count:
+                break
+    return selected
+
+
+class QuestionSelector:
+    """
+    Incremental version of select_questions, for groups whose questions arrive one group at a time.
+    add() picks up to quota questions from a group straight away;
+    finish() fills the quiz up to count from the leftovers, round-robin across groups.
+    """
+
+    def __init__(self, count, quota):
+        self.count = count
+        self.quota = quota
+        self.selected = []
+        self.seen = []
+        self.leftovers = []
+
+    def _take(self, question):
+        normalized = normalize_question(question["question"])
+        if any(is_similar(normalized, other) for other in self.seen):
+            return False
+        self.seen.append(normalized)
+        self.selected.append(question)
+        return True
+
+    def add(self, questions):
+        picked = []
+        queue = list(questions)
+        while queue and len(picked) < self.quota and len(self.selected) < self.count:
+            question = queue.pop(0)
+            if self._take(question):
+                picked.append(question)
+        self.leftovers.append(queue)
+        return picked
+
+    def finish(self):
+        picked = []
+        while len(self.selected) < self.count and any(self.leftovers):
+            for queue in self.leftovers:
+                while queue and len(self.selected) < self.count:
+                    question = queue.pop(0)
+                    if self._take(question):
+                        picked.append(question)
+                        break
+        return picked
+
+
+def parse_question(block):
+    """
+    Parses one "Question: ... / Answers: a|b|c(o)|d" block.
+    Returns None when the block is malformed: no question, not 4 answers or not exactly one (o).
+    """
+    match = re.search(r"Question:\s*(.+?)\s*Answers:\s*(.+)", block, re.DOTALL)
+    if not match:
+        return None
+    question = match.group(1).strip()
+    lines = match.group(2).strip().splitlines()
+    if not lines:
+        return None
+    answers = []
+    for answer in lines[0].split("|"):
+        answer = answer.strip()
+        correct = answer.endswith("(o)")
+        if correct:
+            answer = answer[: -len("(o)")].strip()
+        answers.append({"answer": answer, "correct": correct})
+    if (
+        not question
+        or len(answers) != 4
+        or not all(answer["answer"] for answer in answers)
+        or sum(answer["correct"] for answer in answers) != 1
+    ):
+        return None
+    return {"question": question, "answers": answers}
+
+
+def split_question_blocks(text):
+    # Questions may be numbered ("1. Question: ..."), as QuestionStreamParser also accepts.
+    return [
+        f"Question:{block}"
+        for block in re.split(
+            r"^\s*(?:\d+[.)]\s*)?Question:", text, flags=re.MULTILINE
+        )[1:]
+    ]
+
+
+def parse_quiz_text(text):
+    """
+    Turns the questions LLM output into question dicts, without a second LLM call.
+    Returns (questions, malformed_blocks).
+    """
+    questions = []
+    malformed = []
+    for block in split_question_blocks(text):
+        question = parse_question(block)
+        if question:
+            questions.append(question)
+        else:
+            malformed.append(block.strip())
+    return questions, malformed
+
+
+class QuestionStreamParser:
+    """
+    Incremental version of parse_quiz_text for streamed LLM output.
+    feed() returns the questions completed by the new text.
+    A question is complete once the newline after its (non-blank) answers has arrived,
+    whether they follow "Answers:" on the same line or on the next one.
+    """
+
+    COMPLETE_QUESTION = re.compile(r"Question:.*?Answers:\s*\S[^\n]*\n", re.DOTALL)
+
+    def __init__(self):
+        self.buffer = ""
+        self.malformed = []
+
+    def _parse(self, block):
+        question = parse_question(block)
+        if question is None:
+            self.malformed.append(block.strip())
+        return question
+
+    def feed(self, text):
+        self.buffer += text
+        questions = []
+        while match := self.COMPLETE_QUESTION.search(self.buffer):
+            self.buffer = self.buffer[match.end() :]
+            if question := self._parse(match.group(0)):
+                questions.append(question)
+        return questions
+
+    def close(self):
+        """
+        Parses whatever is left once the stream ends.
+        """
+        questions = [
+            question
+            for block in split_question_blocks(self.buffer)
+            if (question := self._parse(block))
+        ]
+        self.buffer = ""
+        return questions
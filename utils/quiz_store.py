@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUIZ_DB_PATH = "./.cache/quizzes.sqlite"
+
+
+def quiz_key(docs, model, prompt_version):
+    """
+    Identifies a quiz by the content of its chunks, the model and the prompt version.
+    """
+    digest = hashlib.sha256(f"{model}\0{prompt_version}".encode("utf-8"))
+    for doc in docs:
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class QuizStore:
+    """
+    SQLite store of generated quizzes.
+    A document can have up to max_variants quizzes; get() hands out the least recently served one,
+    and pregenerate() makes a new variant in the background while a cached one is served.
+    Quizzes expire after ttl seconds and the least recently used are evicted past max_entries.
+    Quizzes with fewer than min_questions questions are neither stored nor served.
+    """
+
+    def __init__(
+        self,
+        path=QUIZ_DB_PATH,
+        ttl=30 * 24 * 60 * 60,
+        max_entries=5000,
+        max_variants=3,
+        min_questions=1,
+    ):
+        self.path = path
+        self.min_questions = min_questions
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self.generating = set()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS quizzes (
+                id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                questions TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS quizzes_key ON quizzes (key)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT id, questions FROM quizzes
+                WHERE key = ? AND created > ? AND json_array_length(questions) >= ?
+                ORDER BY last_used LIMIT 1
+                """,
+                (key, now - self.ttl, self.min_questions),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE quizzes SET last_used = ? WHERE id = ?", (now, row[0]))
+        return json.loads(row[1])
+
+    def variant_count(self, key):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM quizzes WHERE key = ? AND created > ? AND json_array_length(questions) >= ?",
+                (key, time.time() - self.ttl, self.min_questions),
+            ).fetchone()[0]
+
+    def put(self, key, questions):
+        """
+        Stores questions as a new variant of key. Returns False, storing nothing,
+        when there are fewer than min_questions (e.g. most of the LLM calls failed).
+        """
+        if len(questions) < self.min_questions:
+            return False
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO quizzes (key, questions, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(questions), now, now),
+            )
+            conn.execute(
+                """
+                DELETE FROM quizzes WHERE key = ? AND id NOT IN (
+                SELECT id FROM quizzes WHERE key = ? ORDER BY created DESC LIMIT ?
+                )
+                """,
+                (key, key, self.max_variants),
+            )
+            conn.execute("DELETE FROM quizzes WHERE created <= ?", (now - self.ttl,))
+            conn.execute(
+                """
+                DELETE FROM quizzes WHERE id NOT IN (
+                SELECT id FROM quizzes ORDER BY last_used DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            )
+        return True
+
+    def pregenerate(self, key, generate):
+        """
+        Runs generate() in a background thread and stores its questions as a new variant,
+        unless key already has max_variants or is being generated.
+        """
+        with self.lock:
+            if key in self.generating or self.variant_count(key) >= self.max_variants:
+                return
+            self.generating.add(key)
+
+        def run():
+            try:
+                self.put(key, generate())
+            except Exception as e:
+                print(f"Pre-generating a quiz failed: {e!r}")
+            finally:
+                with self.lock:
+                    self.generating.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
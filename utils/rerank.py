@@ -0,0 +1,46 @@
+import re
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9](?:[a-z0-9_\-.]*[a-z0-9])?")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "of", "on", "or", "that", "the", "this",
+    "to", "what", "when", "where", "which", "who", "why", "with", "you", "your",
+}
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def lexical_overlap(question_terms, text):
+    if not question_terms:
+        return 0.0
+    terms = set(tokenize(text))
+    return len(question_terms & terms) / len(question_terms)
+
+
+def rerank(question, docs, embeddings, alpha=0.7, relative_threshold=0.85):
+    """
+    Scores docs by alpha * cosine similarity + (1 - alpha) * lexical overlap with the question
+    and returns the ones scoring at least relative_threshold of the best, best first.
+    Embeddings go through the embedding cache, so the chunks are not embedded again.
+    """
+    if len(docs) < 2:
+        return docs
+    question_vector = np.asarray(embeddings.embed_query(question))
+    doc_vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in docs]))
+    similarities = doc_vectors @ question_vector / (
+        np.linalg.norm(doc_vectors, axis=1) * np.linalg.norm(question_vector) + 1e-10
+    )
+    question_terms = set(tokenize(question)) - STOPWORDS
+    scores = [
+        alpha * float(similarity)
+        + (1 - alpha) * lexical_overlap(question_terms, doc.page_content)
+        for doc, similarity in zip(docs, similarities)
+    ]
+    ranked = sorted(zip(scores, range(len(docs))), reverse=True)
+    best = ranked[0][0]
+    return [docs[i] for score, i in ranked if score >= best * relative_threshold]
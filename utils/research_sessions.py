@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import time
+
+from utils.assistant_runs import TERMINAL_STATUSES, run_until_done
+from utils.concurrency import Coalescer
+
+RESEARCH_DB_PATH = "./.cache/research.sqlite"
+
+
+def normalize_theme(theme):
+    return " ".join(theme.lower().split())
+
+
+class ResearchSessions:
+    """
+    Keeps one research job per theme.
+    The thread/run ids and the final report are stored in SQLite by normalized theme, so
+    completed reports are served instantly, unfinished runs are resumed instead of started again,
+    and concurrent requests for the same theme wait on the same job.
+    """
+
+    def __init__(self, client, assistant_id, functions_map, path=RESEARCH_DB_PATH):
+        self.client = client
+        self.assistant_id = assistant_id
+        self.functions_map = functions_map
+        self.path = path
+        self.jobs = Coalescer()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS research (
+                key TEXT NOT NULL PRIMARY KEY,
+                theme TEXT NOT NULL,
+                thread_id TEXT,
+                run_id TEXT,
+                status TEXT,
+                report TEXT,
+                updated REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, theme):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT theme, thread_id, run_id, status, report FROM research WHERE key = ?",
+                (normalize_theme(theme),),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("theme", "thread_id", "run_id", "status", "report"), row))
+
+    def _save(self, theme, thread_id, run_id, status, report=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO research VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    normalize_theme(theme),
+                    theme,
+                    thread_id,
+                    run_id,
+                    status,
+                    report,
+                    time.time(),
+                ),
+            )
+
+    def _last_reply(self, thread_id):
+        messages = self.client.beta.threads.messages.list(thread_id=thread_id).data
+        for message in messages:
+            if message.role == "assistant" and message.content:
+                return message.content[0].text.value
+        return None
+
+    def _run(self, theme, on_status):
+        saved = self.get(theme)
+        if saved and saved["run_id"] and saved["status"] not in TERMINAL_STATUSES:
+            thread_id, run_id = saved["thread_id"], saved["run_id"]
+        else:
+            thread = self.client.beta.threads.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": f"I want to search the theme {theme} in DuckDuckGo and Wikipedia",
+                    }
+                ]
+            )
+            run = self.client.beta.threads.runs.create(
+                thread_id=thread.id,
+                assistant_id=self.assistant_id,
+            )
+            thread_id, run_id = thread.id, run.id
+            self._save(theme, thread_id, run_id, run.status)
+
+        try:
+            run = run_until_done(
+                self.client, thread_id, run_id, self.functions_map, on_status=on_status
+            )
+        except Exception as e:
+            # run_until_done cancels the run on timeout. Either way, save a terminal status
+            # so the next request starts a new run instead of resuming this one.
+            status = "cancelled" if isinstance(e, TimeoutError) else "failed"
+            self._save(theme, thread_id, run_id, status)
+            return {"status": status, "report": None, "error": str(e)}
+        report = self._last_reply(thread_id) if run.status == "completed" else None
+        self._save(theme, thread_id, run_id, run.status, report)
+        return {"status": run.status, "report": report}
+
+    def research(self, theme, on_status=None):
+        """
+        Returns {"status", "report"} for theme, running the research only when needed.
+        When the run times out or the API fails, status is "cancelled" or "failed" and "error" says why.
+        """
+        saved = self.get(theme)
+        if saved and saved["status"] == "completed":
+            return {"status": "completed", "report": saved["report"]}
+
+        return self.jobs.run(normalize_theme(theme), lambda: self._run(theme, on_status))
@@ -0,0 +1,33 @@
+from langchain.utilities import DuckDuckGoSearchAPIWrapper
+
+from utils.tool_runtime import ToolRuntime
+from utils.wikipedia import get_wikipedia_client
+
+runtime = ToolRuntime()
+
+# One wrapper for every call instead of a new one per call.
+ddg = DuckDuckGoSearchAPIWrapper()
+
+
+@runtime.tool(
+    description="Returns content searched in Wikipedia with the given theme.",
+    parameters={"theme": "The theme that user wants to search"},
+    ttl=60 * 60,
+    max_tokens=800,
+)
+def get_wpd_result(inputs):
+    theme = inputs["theme"]
+    return get_wikipedia_client().run(theme)
+
+
+@runtime.tool(
+    description="Returns content searched in DuckDuckGo with the given theme.",
+    parameters={"theme": "The theme that user wants to search"},
+    ttl=10 * 60,
+    # DuckDuckGo rate-limits aggressively.
+    max_concurrency=2,
+    max_tokens=600,
+)
+def get_ddg_result(inputs):
+    theme = inputs["theme"]
+    return ddg.run(theme)
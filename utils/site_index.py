@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import re
+import uuid
+
+import requests
+from bs4 import BeautifulSoup
+from langchain.vectorstores.faiss import FAISS
+
+from utils.bm25 import BM25Index
+from utils.chunking import iter_split_documents
+from utils.concurrency import batched
+from utils.crawler import Crawler
+
+INDEX_DIR = "./.cache/site_index"
+
+# Chunks are embedded and indexed in batches of this size while the rest are still being split.
+INDEX_BATCH_SIZE = 256
+
+
+def get_index_dir(url, filter_urls):
+    key = hashlib.sha256(json.dumps([url, filter_urls]).encode("utf-8")).hexdigest()
+    return os.path.join(INDEX_DIR, key[:16])
+
+
+def fetch_sitemap_entries(url, filter_urls=None):
+    """
+    Returns {loc: lastmod} for every page of the sitemap that matches filter_urls.
+    Nested sitemap indexes are followed.
+    """
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.content, "xml")
+    entries = {}
+    for sitemap in soup.find_all("sitemap"):
+        loc = sitemap.find("loc")
+        if loc:
+            entries.update(fetch_sitemap_entries(loc.text.strip(), filter_urls))
+    for page in soup.find_all("url"):
+        loc = page.find("loc")
+        if not loc:
+            continue
+        loc = loc.text.strip()
+        if filter_urls and not any(re.match(r, loc) for r in filter_urls):
+            continue
+        lastmod = page.find("lastmod")
+        entries[loc] = lastmod.text.strip() if lastmod else None
+    return entries
+
+
+def read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"version": 0, "pages": {}}
+
+
+def write_manifest(index_dir, manifest):
+    path = os.path.join(index_dir, "manifest.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_site_index(
+    url, filter_urls, extractor, splitter_config, embeddings, crawler_options=None
+):
+    """
+    Loads the FAISS index of a sitemap from disk and brings it up to date.
+    Only pages whose lastmod changed (or that are new) are fetched and embedded again,
+    and pages that left the sitemap are deleted from the index.
+    A changed page keeps its old chunks until it has been fetched again successfully.
+    A BM25 index over the same chunks is kept next to the FAISS files.
+    crawler_options go to Crawler (e.g. requests_per_second and burst, per host).
+    Returns (vector_store, bm25, version). version goes up every time the index changes.
+    """
+    index_dir = get_index_dir(url, filter_urls)
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = read_manifest(index_dir)
+    pages = manifest["pages"]
+
+    vector_store = None
+    bm25 = BM25Index()
+    bm25_path = os.path.join(index_dir, "bm25.json")
+    if os.path.exists(os.path.join(index_dir, "index.faiss")):
+        vector_store = FAISS.load_local(index_dir, embeddings)
+        if os.path.exists(bm25_path):
+            bm25 = BM25Index.load(bm25_path)
+        else:
+            ids = list(vector_store.index_to_docstore_id.values())
+            bm25.add(ids, [vector_store.docstore.search(id).page_content for id in ids])
+            bm25.save(bm25_path)
+
+    entries = fetch_sitemap_entries(url, filter_urls)
+    removed = [loc for loc in pages if loc not in entries]
+    changed = [
+        loc
+        for loc, lastmod in entries.items()
+        if loc not in pages or (lastmod and pages[loc]["lastmod"] != lastmod)
+    ]
+    if not removed and not changed and vector_store is not None:
+        return vector_store, bm25, manifest["version"]
+
+    pages_docs = []
+    crawler = Crawler(**(crawler_options or {}))
+    # Same id until the index is saved, so a crawl interrupted before then resumes.
+    crawl_id = f"{os.path.basename(index_dir)}-{manifest['version']}"
+    if changed:
+        changed_entries = {loc: entries[loc] for loc in changed}
+        pages_docs = crawler.crawl(crawl_id, changed_entries, extractor)
+    fetched = {doc.metadata["source"] for doc in pages_docs}
+    if not removed and not fetched and vector_store is not None:
+        return vector_store, bm25, manifest["version"]
+
+    # Pages that failed to fetch keep their old chunks and lastmod, so they are tried again next time.
+    stale = removed + [loc for loc in changed if loc in fetched]
+    stale_ids = [id for loc in stale if loc in pages for id in pages[loc]["ids"]]
+    if vector_store is not None and stale_ids:
+        vector_store.delete(stale_ids)
+        bm25.delete(stale_ids)
+    for loc in removed:
+        del pages[loc]
+    for loc in fetched:
+        pages[loc] = {"lastmod": entries[loc], "ids": []}
+
+    chunks = iter_split_documents(pages_docs, splitter_config)
+    for docs in batched(chunks, INDEX_BATCH_SIZE):
+        ids = [str(uuid.uuid4()) for _ in docs]
+        for doc, id in zip(docs, ids):
+            pages[doc.metadata["source"]]["ids"].append(id)
+        bm25.add(ids, [doc.page_content for doc in docs])
+        if vector_store is None:
+            vector_store = FAISS.from_documents(docs, embeddings, ids=ids)
+        else:
+            vector_store.add_documents(docs, ids=ids)
+    if vector_store is None:
+        raise ValueError(f"No pages found in {url}")
+
+    vector_store.save_local(index_dir)
+    bm25.save(bm25_path)
+    manifest["version"] += 1
+    write_manifest(index_dir, manifest)
+    # The next crawl gets a new id, so this one's frontier rows would never be read again.
+    crawler.store.clear_frontier(crawl_id)
+    return vector_store, bm25, manifest["version"]
@@ -0,0 +1,165 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DB_PATH = "movies.sqlite"
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+class UnsafeQuery(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    sql = " ".join(sql.strip().split())
+    return sql.rstrip(";").strip()
+
+
+class QueryEngine:
+    """
+    Read-only queries over movies.sqlite for the SQL page.
+    Queries check out one of up to pool_size mode=ro, query_only connections and hand it back after,
+    so connections (and their statement caches, which let repeated SQL reuse its prepared statement)
+    outlive the Streamlit script run that opened them. Queries are stopped after time_limit seconds
+    by a progress handler, and results are cached (LRU) by normalized SQL and the file's mtime.
+    """
+
+    def __init__(
+        self,
+        path=DB_PATH,
+        time_limit=5,
+        max_rows=200,
+        cache_size=256,
+        cached_statements=256,
+        pool_size=4,
+    ):
+        self.path = os.path.abspath(path)
+        self.time_limit = time_limit
+        self.max_rows = max_rows
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self.pool_size = pool_size
+        # LIFO, so the most recently used connection, with the warmest caches, is reused first.
+        self.pool = queue.LifoQueue()
+        self.opened = 0
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.schema = None
+
+    def _open(self):
+        conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro",
+            uri=True,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out of the pool, opening one if fewer than pool_size exist,
+        else waiting for one to be handed back.
+        """
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.pool_size
+                if can_open:
+                    self.opened += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self.lock:
+                        self.opened -= 1
+                    raise
+            else:
+                conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def version(self):
+        # WAL writes land in the -wal file first, so it counts too.
+        mtimes = [os.path.getmtime(self.path)]
+        if os.path.exists(f"{self.path}-wal"):
+            mtimes.append(os.path.getmtime(f"{self.path}-wal"))
+        return max(mtimes)
+
+    def schema_snapshot(self, sample_rows=3):
+        """
+        CREATE statements plus a few sample rows per table, for building prompts.
+        Only rebuilt when the database file changes.
+        """
+        version = self.version()
+        if self.schema and self.schema[0] == version:
+            return self.schema[1]
+        parts = []
+        with self.connection() as conn:
+            tables = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            for name, create in tables:
+                cursor = conn.execute(f'SELECT * FROM "{name}" LIMIT ?', (sample_rows,))
+                columns = [column[0] for column in cursor.description]
+                rows = "\n".join("\t".join(map(str, row)) for row in cursor.fetchall())
+                parts.append(
+                    f"{create}\n/*\n{sample_rows} rows from {name} table:\n"
+                    + "\t".join(columns)
+                    + f"\n{rows}\n*/"
+                )
+        snapshot = "\n\n".join(parts)
+        self.schema = (version, snapshot)
+        return snapshot
+
+    def _check(self, sql):
+        if ";" in sql:
+            raise UnsafeQuery("Only a single statement is allowed.")
+        if not re.match(r"(?i)^(select|with)\b", sql):
+            raise UnsafeQuery("Only SELECT queries are allowed.")
+
+    def query(self, sql, params=()):
+        """
+        Returns (columns, rows) with at most max_rows rows.
+        """
+        sql = normalize_sql(sql)
+        self._check(sql)
+        key = (sql, tuple(params), self.version())
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        with self.connection() as conn:
+            deadline = time.monotonic() + self.time_limit
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, 10_000)
+            try:
+                cursor = conn.execute(sql, params)
+                columns = [column[0] for column in cursor.description or []]
+                rows = cursor.fetchmany(self.max_rows)
+                cursor.close()
+            except sqlite3.OperationalError as e:
+                if "interrupted" in str(e):
+                    raise QueryTimeout(f"Query took longer than {self.time_limit}s") from e
+                raise
+            finally:
+                conn.set_progress_handler(None, 0)
+
+        result = (columns, rows)
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.cache_size:
+                self.results.popitem(last=False)
+        return result
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pandas as pd
+
+
+def _yfinance_ticker(symbol):
+    import yfinance
+
+    return yfinance.Ticker(symbol)
+
+
+DATASETS = {
+    "income_stmt": lambda ticker: ticker.income_stmt,
+    "balance_sheet": lambda ticker: ticker.balance_sheet,
+    "history": lambda ticker: ticker.history(period="3mo"),
+}
+
+
+class TickerCache:
+    """
+    Per-ticker DataFrame cache shared by the investor tools.
+    ticker_factory builds the Ticker for a symbol; pass a fake one to run without yfinance.
+    """
+
+    def __init__(self, ticker_factory=_yfinance_ticker, ttl=15 * 60):
+        self.ticker_factory = ticker_factory
+        self.ttl = ttl
+        self.tickers = {}
+        self.frames = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def _lock(self, symbol):
+        with self.lock:
+            return self.locks.setdefault(symbol, threading.Lock())
+
+    def get(self, symbol, dataset):
+        symbol = symbol.strip().upper()
+        key = (symbol, dataset)
+        # One lock per ticker, so concurrent tools for the same ticker fetch it once.
+        with self._lock(symbol):
+            cached = self.frames.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+            if symbol not in self.tickers:
+                self.tickers[symbol] = self.ticker_factory(symbol)
+            frame = DATASETS[dataset](self.tickers[symbol])
+            self.frames[key] = (time.monotonic(), frame)
+            return frame
+
+
+def to_compact(df, max_rows=20, max_columns=8, tail=False):
+    """
+    Serializes a DataFrame once, column-oriented ("split": columns, index, data),
+    keeping at most max_rows rows (the last ones if tail) and max_columns columns.
+    """
+    df = df.tail(max_rows) if tail else df.head(max_rows)
+    df = df.iloc[:, :max_columns]
+    # Dates as YYYY-MM-DD: the full ISO timestamps cost about twice the tokens.
+    if isinstance(df.index, pd.DatetimeIndex):
+        df = df.set_axis(df.index.strftime("%Y-%m-%d"), axis=0)
+    if isinstance(df.columns, pd.DatetimeIndex):
+        df = df.set_axis(df.columns.strftime("%Y-%m-%d"), axis=1)
+    return df.to_json(orient="split", date_format="iso", double_precision=4)
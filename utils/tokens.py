@@ -0,0 +1,12 @@
+from functools import lru_cache
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model="gpt-3.5-turbo"):
+    return tiktoken.encoding_for_model(model)
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    return len(get_encoding(model).encode(text, disallowed_special=()))
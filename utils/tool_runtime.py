@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.compaction import compact_output
+from utils.concurrency import Coalescer
+
+
+def canonicalize(args):
+    """
+    Same arguments, same key: sorted keys and collapsed whitespace in strings.
+    """
+
+    def clean(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, dict):
+            return {key: clean(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [clean(item) for item in value]
+        return value
+
+    return json.dumps(clean(args), sort_keys=True, separators=(",", ":"))
+
+
+class Tool:
+    def __init__(
+        self,
+        fn,
+        name,
+        description,
+        parameters,
+        ttl,
+        max_concurrency,
+        timeout,
+        max_tokens,
+        tail,
+    ):
+        self.fn = fn
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.tail = tail
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def schema(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        name: {"type": "string", "description": description}
+                        for name, description in self.parameters.items()
+                    },
+                    "required": list(self.parameters),
+                },
+            },
+        }
+
+
+class ToolRuntime:
+    """
+    Runs the assistant's tools.
+    Results are cached by tool name and canonicalized arguments for the tool's ttl,
+    identical calls in flight at the same time share one execution,
+    and every tool has its own concurrency limit and timeout.
+    Outputs of tools with max_tokens are compacted to that many tokens;
+    stats keeps the tokens before and after compaction per tool.
+    """
+
+    def __init__(self, max_cache_entries=1000, max_workers=16):
+        self.tools = {}
+        self.cache = OrderedDict()
+        self.in_flight = Coalescer()
+        self.stats = {}
+        self.max_cache_entries = max_cache_entries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+
+    def tool(
+        self,
+        description,
+        parameters,
+        ttl=10 * 60,
+        max_concurrency=4,
+        timeout=30,
+        max_tokens=None,
+        tail=False,
+    ):
+        """
+        Registers a function as a tool. parameters maps every (string) argument to its description.
+        tail makes compaction keep the end of a table output rather than its start.
+        """
+
+        def register(fn):
+            self.tools[fn.__name__] = Tool(
+                fn,
+                fn.__name__,
+                description,
+                parameters,
+                ttl,
+                max_concurrency,
+                timeout,
+                max_tokens,
+                tail,
+            )
+            return fn
+
+        return register
+
+    @property
+    def functions(self):
+        return [tool.schema for tool in self.tools.values()]
+
+    @property
+    def functions_map(self):
+        return {
+            name: lambda inputs, name=name: self.call(name, inputs) for name in self.tools
+        }
+
+    def _compact(self, tool, inputs, result):
+        query = " ".join(str(value) for value in inputs.values())
+        result, before, after = compact_output(
+            str(result), query, tool.max_tokens, tool.tail
+        )
+        with self.lock:
+            stats = self.stats.setdefault(
+                tool.name, {"calls": 0, "tokens_in": 0, "tokens_out": 0}
+            )
+            stats["calls"] += 1
+            stats["tokens_in"] += before
+            stats["tokens_out"] += after
+        if after < before:
+            print(f"Compacted {tool.name} output from {before} to {after} tokens")
+        return result
+
+    def _cached(self, key, ttl):
+        with self.lock:
+            if key not in self.cache:
+                return None
+            created, result = self.cache[key]
+            if time.monotonic() - created > ttl:
+                del self.cache[key]
+                return None
+            self.cache.move_to_end(key)
+            return result
+
+    def _run(self, tool, inputs):
+        # The slot is released when fn returns, not when the caller gives up on it,
+        # so calls that hang past their timeout still count against max_concurrency.
+        if not tool.slots.acquire(timeout=tool.timeout):
+            raise TimeoutError(f"{tool.name} had no free slot for {tool.timeout}s")
+
+        def run():
+            try:
+                return tool.fn(inputs)
+            finally:
+                tool.slots.release()
+
+        try:
+            future = self.executor.submit(run)
+        except BaseException:
+            tool.slots.release()
+            raise
+        return future.result(timeout=tool.timeout)
+
+    def call(self, name, inputs):
+        tool = self.tools[name]
+        key = (name, canonicalize(inputs))
+        if (result := self._cached(key, tool.ttl)) is not None:
+            return result
+
+        def execute():
+            result = self._run(tool, inputs)
+            if tool.max_tokens:
+                result = self._compact(tool, inputs, result)
+            with self.lock:
+                self.cache[key] = (time.monotonic(), result)
+                while len(self.cache) > self.max_cache_entries:
+                    self.cache.popitem(last=False)
+            return result
+
+        return self.in_flight.run(key, execute)
@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from langchain.schema import Document
+
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+WIKIPEDIA_CACHE_PATH = "./.cache/wikipedia.sqlite"
+
+
+def normalize_title(title):
+    return " ".join(title.replace("_", " ").split()).lower()
+
+
+def get_summary(content):
+    # The intro is everything before the first section heading.
+    return re.split(r"\n+==", content, maxsplit=1)[0].strip()
+
+
+class WikipediaClient:
+    """
+    Shared Wikipedia access for QuizGPT and ResearchGPT.
+    Uses one pooled HTTP session, fetches the top results concurrently
+    and keeps searches and articles in a SQLite cache.
+    Cached articles younger than ttl are served without any request;
+    older ones are only downloaded again when their revision changed.
+    """
+
+    def __init__(
+        self,
+        api_url=WIKIPEDIA_API_URL,
+        cache_path=WIKIPEDIA_CACHE_PATH,
+        ttl=24 * 60 * 60,
+        max_workers=8,
+        timeout=20,
+    ):
+        self.api_url = api_url
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_workers
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "python-gpt-study/1.0"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+            key TEXT NOT NULL PRIMARY KEY,
+            title TEXT NOT NULL,
+            revid INTEGER,
+            url TEXT,
+            content TEXT NOT NULL,
+            fetched REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS searches (
+            key TEXT NOT NULL PRIMARY KEY,
+            titles TEXT NOT NULL,
+            fetched REAL NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def _get(self, **params):
+        response = self.session.get(
+            self.api_url,
+            params={"format": "json", "formatversion": 2, **params},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            self.conn.commit()
+        return rows
+
+    def search(self, query, top_k=5):
+        key = f"{normalize_title(query)}\0{top_k}"
+        rows = self._execute(
+            "SELECT titles FROM searches WHERE key = ? AND fetched > ?",
+            (key, time.time() - self.ttl),
+        )
+        if rows:
+            return json.loads(rows[0][0])
+        data = self._get(action="query", list="search", srsearch=query, srlimit=top_k)
+        titles = [result["title"] for result in data["query"]["search"]]
+        self._execute(
+            "INSERT OR REPLACE INTO searches VALUES (?, ?, ?)",
+            (key, json.dumps(titles), time.time()),
+        )
+        return titles
+
+    def _cached_article(self, title):
+        rows = self._execute(
+            "SELECT title, revid, url, content, fetched FROM articles WHERE key = ?",
+            (normalize_title(title),),
+        )
+        if not rows:
+            return None
+        title, revid, url, content, fetched = rows[0]
+        return {
+            "title": title,
+            "revid": revid,
+            "url": url,
+            "content": content,
+            "fetched": fetched,
+        }
+
+    def _store_article(self, key, article):
+        self._execute(
+            "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                article["title"],
+                article["revid"],
+                article["url"],
+                article["content"],
+                time.time(),
+            ),
+        )
+
+    def get_article(self, title):
+        """
+        Returns {"title", "revid", "url", "content"} for title, or None if there is no such page.
+        """
+        cached = self._cached_article(title)
+        if cached and time.time() - cached["fetched"] < self.ttl:
+            return cached
+
+        params = {"action": "query", "titles": title, "redirects": 1, "prop": "revisions|info"}
+        if cached:
+            # Only ask for the revision first; the text is downloaded again only if it changed.
+            page = self._get(rvprop="ids", inprop="url", **params)["query"]["pages"][0]
+            if page.get("revisions") and page["revisions"][0]["revid"] == cached["revid"]:
+                self._store_article(normalize_title(title), cached)
+                return cached
+
+        params["prop"] = "extracts|revisions|info"
+        page = self._get(explaintext=1, rvprop="ids", inprop="url", **params)["query"][
+            "pages"
+        ][0]
+        if page.get("missing") or "extract" not in page:
+            return None
+        article = {
+            "title": page["title"],
+            "revid": page["revisions"][0]["revid"] if page.get("revisions") else None,
+            "url": page.get("fullurl"),
+            "content": page["extract"],
+        }
+        self._store_article(normalize_title(title), article)
+        if normalize_title(page["title"]) != normalize_title(title):
+            self._store_article(normalize_title(page["title"]), article)
+        return article
+
+    def get_articles(self, titles):
+        """
+        Fetches titles concurrently and returns the articles that exist, in order.
+        An article that fails to fetch (HTTP error, timeout) is left out instead of failing the rest.
+        """
+        titles = list(titles)
+        futures = [self.executor.submit(self.get_article, title) for title in titles]
+        articles = []
+        for title, future in zip(titles, futures):
+            try:
+                article = future.result()
+            except Exception as e:
+                print(f"Skipping Wikipedia article {title}: {e!r}")
+                continue
+            if article is not None:
+                articles.append(article)
+        return articles
+
+    def prefetch_links(self, title, limit=10):
+        """
+        Warms the cache with the first articles linked from title, in the background.
+        """
+
+        def run():
+            try:
+                data = self._get(
+                    action="query", titles=title, prop="links", plnamespace=0, pllimit=limit
+                )
+                links = [link["title"] for link in data["query"]["pages"][0].get("links", [])]
+                self.get_articles(links)
+            except Exception as e:
+                print(f"Prefetching links of {title} failed: {e!r}")
+
+        # A thread of its own: get_articles waits on the executor, so it can't run inside it.
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_documents(self, query, top_k=5, max_chars=4000, prefetch=False):
+        """
+        Same documents WikipediaRetriever returns, from the cache when possible.
+        """
+        articles = self.get_articles(self.search(query, top_k))
+        if prefetch and articles:
+            self.prefetch_links(articles[0]["title"])
+        return [
+            Document(
+                page_content=article["content"][:max_chars],
+                metadata={
+                    "title": article["title"],
+                    "summary": get_summary(article["content"]),
+                    "source": article["url"],
+                },
+            )
+            for article in articles
+        ]
+
+    def run(self, query, top_k=3, max_chars=4000):
+        """
+        Same text WikipediaAPIWrapper.run returns, from the cache when possible.
+        """
+        articles = self.get_articles(self.search(query, top_k))
+        if not articles:
+            return "No good Wikipedia Search Result was found"
+        summaries = [
+            f"Page: {article['title']}\nSummary: {get_summary(article['content'])}"
+            for article in articles
+        ]
+        return "\n\n".join(summaries)[:max_chars]
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_wikipedia_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = WikipediaClient(api_url=os.environ.get("WIKIPEDIA_API_URL", WIKIPEDIA_API_URL))
+        return _client